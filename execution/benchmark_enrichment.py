@@ -0,0 +1,123 @@
+"""
+Enrichment Throughput Benchmark
+
+Resolves a batch of synthetic ODS codes against a local stand-in ODS API
+(see ods_stub_server.py) with different worker counts, and reports how
+many codes per second each setting achieves. Nothing is sent to the real
+NHS ODS API and no map files are touched.
+
+Each worker count is run twice: once opening a new connection per request,
+as the module-level `requests.get` does, and once through a pooled
+keep-alive session (see http_session.py), to show the connection reuse gain.
+The stand-in is plain HTTP on loopback, so the real API's TLS handshakes
+would make the gap larger.
+
+Give the stand-in a --stub-rate-limit to see how the adaptive rate limiter
+settles against throttling when allowed to probe above its starting rate.
+
+Usage:
+    python execution/benchmark_enrichment.py
+    python execution/benchmark_enrichment.py --codes 200 --latency 0.3 --workers 1 4 16 --requests-per-second 50
+    python execution/benchmark_enrichment.py --workers 16 --requests-per-second 5 \
+        --max-requests-per-second 40 --stub-rate-limit 20
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import requests
+
+# Add execution directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from enrich_gp_data import resolve_commissioner_codes
+from http_session import create_session
+from ods_stub_server import start_stub_server
+from rate_control import TokenBucketRateLimiter
+
+
+def main():
+    """Main CLI interface"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark concurrent ODS lookups against a local stand-in API"
+    )
+
+    parser.add_argument("--codes", type=int, default=100, help="Number of ODS codes to resolve per run (default: 100)")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stand-in API response delay in seconds (default: 0.3)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16], help="Worker counts to compare (default: 1 4 16)")
+    parser.add_argument(
+        "--requests-per-second",
+        type=float,
+        default=0,
+        help="Starting rate limit across workers; 0 for unlimited (default: 0)",
+    )
+    parser.add_argument(
+        "--max-requests-per-second",
+        type=float,
+        default=None,
+        help="Rate the limiter may probe up to (default: the starting rate)",
+    )
+    parser.add_argument(
+        "--stub-rate-limit",
+        type=float,
+        default=0,
+        help="Requests/second the stand-in accepts before answering 429; 0 for none (default: 0)",
+    )
+
+    args = parser.parse_args()
+
+    # Per-code results aren't interesting here
+    logging.getLogger("enrich_gp_data").setLevel(logging.ERROR)
+
+    server = start_stub_server(
+        port=0, latency=args.latency, map_file=None, rate_limit=args.stub_rate_limit
+    )
+    ods_codes = [f"Z{number:05d}" for number in range(args.codes)]
+
+    print(
+        f"Resolving {args.codes} codes, stand-in latency {args.latency}s, "
+        f"rate limit {args.requests_per_second or 'none'} requests/second"
+    )
+    try:
+        for workers in args.workers:
+            # The requests module's own get() opens a new connection every call
+            for label, session in (("unpooled", requests), ("pooled", create_session(pool_size=workers))):
+                rate_limiter = TokenBucketRateLimiter(
+                    args.requests_per_second, args.max_requests_per_second
+                )
+                connections_before = server.connection_count
+                throttled_before = server.throttled_count
+                started = time.perf_counter()
+                resolved = sum(
+                    1
+                    for _, icb_code, _ in resolve_commissioner_codes(
+                        ods_codes, workers, rate_limiter, server.api_url, session
+                    )
+                    if icb_code
+                )
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{workers:>4} workers, {label:<8}: {elapsed:6.2f}s  {args.codes / elapsed:7.1f} codes/s  "
+                    f"{server.connection_count - connections_before:>5} connections  "
+                    f"({resolved} resolved, {rate_limiter.throttled_count} throttled, "
+                    f"final rate {rate_limiter.rate:.1f}/s)"
+                )
+                # Every 429 the stand-in sent must have reached the rate limiter,
+                # rather than being retried inside the session
+                if server.throttled_count - throttled_before != rate_limiter.throttled_count:
+                    print(
+                        f"Error: the stand-in sent {server.throttled_count - throttled_before} 429s "
+                        f"but the rate limiter saw {rate_limiter.throttled_count}",
+                        file=sys.stderr,
+                    )
+                    sys.exit(1)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
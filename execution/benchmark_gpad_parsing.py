@@ -0,0 +1,172 @@
+"""
+Crosstab Parsing Benchmark
+
+Writes a synthetic national-size Practice Level Crosstab (one CSV per NHS
+region, many appointment rows per practice, in the published column layout)
+to a temporary directory, then times the column-projected parser in
+download_gpad.py against the previous loop, which split every row with
+csv.reader. Both must produce identical results. Nothing is downloaded and
+no data files are touched.
+
+A fraction of practice names are quoted (e.g. "SURGERY, THE"), so the
+csv module fallback for quoted lines is exercised too.
+
+Usage:
+    python execution/benchmark_gpad_parsing.py
+    python execution/benchmark_gpad_parsing.py --practices 6300 --rows-per-practice 1000 --quoted-names 0.1
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add execution directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from download_gpad import process_data_file
+from helpers import get_main_system_from_value
+
+
+REGIONS = [
+    "East_of_England",
+    "London",
+    "Midlands",
+    "North_East_and_Yorkshire",
+    "North_West",
+    "South_East",
+    "South_West",
+]
+
+HEADER = [
+    "SUB_ICB_LOCATION_CODE", "GP_CODE", "GP_NAME", "GP_SYSTEM_SUPPLIER", "APPT_STATUS",
+    "HCP_TYPE", "APPT_MODE", "TIME_BETWEEN_BOOK_AND_APPT", "COUNT_OF_APPOINTMENTS", "APPOINTMENT_MONTH",
+]
+
+SYSTEMS = ["EMIS", "TPP", "EVERGREENLIFE/TPP", "EMIS/EVERGREENLIFE", "MEDICUS"]
+APPOINTMENT_STATUSES = ["Attended", "DNA", "Unknown"]
+HCP_TYPES = ["GP", "Other Practice staff", "Unknown"]
+APPOINTMENT_MODES = ["Face-to-Face", "Telephone", "Home Visit", "Video Conference/Online", "Unknown"]
+BOOKING_INTERVALS = ["Same Day", "1 Day", "2 to 7 Days", "8  to 14 Days", "15  to 21 Days", "22  to 28 Days", "More than 28 Days"]
+
+
+def write_synthetic_crosstabs(directory: str, practices: int, rows_per_practice: int, quoted_names: float):
+    """
+    Write synthetic Practice Level Crosstab files, one per region
+
+    Args:
+        directory: Directory to write the files to
+        practices: Number of GP practices across all regions
+        rows_per_practice: Appointment rows per practice
+        quoted_names: Fraction of practice names containing a comma (and so quoted)
+
+    Returns:
+        Tuple of (file paths in region order, total rows written)
+    """
+    random.seed(0)
+    paths = []
+    total_rows = 0
+    for region_number, region in enumerate(REGIONS):
+        path = os.path.join(directory, f"Practice_Level_Crosstab_{region}_Jan_25.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADER)
+            for practice in range(region_number, practices, len(REGIONS)):
+                gp_code = f"{chr(ord('A') + practice % 26)}{81000 + practice:05d}"
+                gp_name = f"PRACTICE {gp_code}"
+                if random.random() < quoted_names:
+                    gp_name = f"{gp_name} SURGERY, THE"
+                system = random.choice(SYSTEMS)
+                sub_icb = f"{practice % 100:02d}X"
+                for _ in range(rows_per_practice):
+                    writer.writerow([
+                        sub_icb, gp_code, gp_name, system,
+                        random.choice(APPOINTMENT_STATUSES), random.choice(HCP_TYPES),
+                        random.choice(APPOINTMENT_MODES), random.choice(BOOKING_INTERVALS),
+                        random.randint(1, 500), "JAN2025",
+                    ])
+                total_rows += rows_per_practice
+        paths.append(path)
+    return paths, total_rows
+
+
+def process_data_file_with_csv_reader(file, data: dict, gp_code_to_name: dict):
+    """The previous parser, which split every row with csv.reader (the baseline)"""
+    reader = csv.reader(file)
+    for index, row in enumerate(reader):
+        if index == 0:
+            continue
+
+        if len(row) < 4:
+            continue
+
+        gp_code = row[1]
+        gp_name = row[2]
+        appointments_systems = row[3]
+
+        main_system = get_main_system_from_value(appointments_systems)
+
+        if gp_code not in data:
+            data[gp_code] = (appointments_systems, main_system)
+
+        if gp_code not in gp_code_to_name:
+            gp_code_to_name[gp_code] = gp_name
+
+
+def time_parser(parse, paths: list[str]):
+    """
+    Parse every file with a parser
+
+    Returns:
+        Tuple of (seconds taken, data dict, gp_code_to_name dict)
+    """
+    data = {}
+    gp_code_to_name = {}
+    started = time.perf_counter()
+    for path in paths:
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            parse(file, data, gp_code_to_name)
+    return time.perf_counter() - started, data, gp_code_to_name
+
+
+def main():
+    """Main CLI interface"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark crosstab parsing on a synthetic national-size Practice Level Crosstab"
+    )
+
+    parser.add_argument("--practices", type=int, default=6300, help="GP practices across all regions (default: 6300)")
+    parser.add_argument("--rows-per-practice", type=int, default=1000, help="Appointment rows per practice (default: 1000)")
+    parser.add_argument("--quoted-names", type=float, default=0.1, help="Fraction of practice names that are quoted (default: 0.1)")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        paths, total_rows = write_synthetic_crosstabs(
+            directory, args.practices, args.rows_per_practice, args.quoted_names
+        )
+        size = sum(os.path.getsize(path) for path in paths)
+        print(
+            f"Wrote {total_rows:,} rows ({size / 1024 / 1024:.0f} MB) in {len(paths)} regional files "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        baseline_seconds, baseline_data, baseline_names = time_parser(process_data_file_with_csv_reader, paths)
+        projected_seconds, projected_data, projected_names = time_parser(process_data_file, paths)
+
+    if (list(projected_data.items()), projected_names) != (list(baseline_data.items()), baseline_names):
+        print("Results differ between the parsers")
+        sys.exit(1)
+
+    print(f"{'Parser':<22} {'Seconds':>8} {'Rows/s':>12}")
+    for name, seconds in [("csv.reader (baseline)", baseline_seconds), ("projected", projected_seconds)]:
+        print(f"{name:<22} {seconds:>8.2f} {total_rows / seconds:>12,.0f}")
+    print(f"Speed-up: {baseline_seconds / projected_seconds:.1f}x ({len(projected_data):,} practices, identical results)")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,11 +12,17 @@ Adapted for 3-layer architecture:
 Usage:
     python execution/download_gpad.py --month 2025-01
     python execution/download_gpad.py --month 2025-01 --zip-file https://files.digital.nhs.uk/[URL]
+    python execution/download_gpad.py --month 2025-01 --segments 4
+    python execution/download_gpad.py --month 2025-01 --extract
+    python execution/download_gpad.py --month 2025-01 --workers 7
 """
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 import csv
 from datetime import datetime
+import io
+from itertools import chain
 import logging
 import os
 from pathlib import Path
@@ -32,10 +38,14 @@ import requests
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from helpers import (
+    get_data_file_names,
     get_data_file_paths,
     get_main_system_from_value,
     get_month_and_year_from_iso_month,
+    write_indexed_csv,
 )
+from file_download import create_progress_logger, download_file, format_bytes
+from http_session import DEFAULT_RETRIES, create_session
 
 # Configuration
 BASE_URL = "https://digital.nhs.uk/data-and-information/publications/statistical/appointments-in-general-practice"
@@ -49,36 +59,60 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def main(month: str, zip_file: str = None):
+def main(
+    month: str,
+    zip_file: str = None,
+    session: requests.Session = None,
+    segments: int = 1,
+    extract: bool = False,
+    workers: int = 1,
+):
     """
     Main execution function for downloading and processing GP supplier data
     
     Args:
         month: ISO month string (e.g. "2025-01")
         zip_file: Optional direct URL to zip file (bypasses NHS website scraping)
+        session: Optional HTTP session to download with (see http_session.py)
+        segments: Parallel range requests to download the zip with
+        extract: Extract the whole zip to .tmp/<month>/ and process the files from there,
+            instead of reading the data files straight out of the zip
+        workers: Processes to parse the regional data files in (1 to parse them in this process)
     """
     logger.info(f"Starting GP supplier data update for {month}")
     
     try:
-        download_gpad_zip_file(month, zip_file)
+        download_gpad_zip_file(month, zip_file, session, segments)
     except Exception as e:
         logger.error(f"Error downloading zip file: {e}")
         raise e
 
-    try:
-        unzip_dir = unzip_gpad_zip_file(month)
-    except Exception as e:
-        logger.error(f"Error unzipping zip file: {e}")
-        raise e
+    zip_path = os.path.join(TMP_DIR, f"{month}.zip")
+    if extract:
+        try:
+            unzip_dir = unzip_gpad_zip_file(month)
+        except Exception as e:
+            logger.error(f"Error unzipping zip file: {e}")
+            raise e
 
-    input_file_paths = get_data_file_paths(unzip_dir, month)
+        input_file_paths = get_data_file_paths(unzip_dir, month)
+    else:
+        try:
+            with zipfile.ZipFile(zip_path, "r") as zip_ref:
+                input_file_paths = get_data_file_names(zip_ref.namelist(), month)
+        except Exception as e:
+            logger.error(f"Error reading zip file: {e}")
+            raise e
     logger.info(f"Found {len(input_file_paths)} data files")
 
     if len(input_file_paths) == 0:
-        raise Exception(f"No data files found for {month}. Check the extracted zip contents.")
+        raise Exception(f"No data files found for {month}. Check the zip contents.")
 
     try:
-        data, gp_code_to_name = process_data_files(input_file_paths)
+        if extract:
+            data, gp_code_to_name = process_data_files(input_file_paths, workers)
+        else:
+            data, gp_code_to_name = process_zip_data_files(zip_path, input_file_paths, workers)
     except Exception as e:
         logger.error(f"Error processing data file: {e}")
         raise e
@@ -101,15 +135,24 @@ def main(month: str, zip_file: str = None):
     logger.info(f"✓ Total GP practices: {len(data)}")
 
 
-def download_gpad_zip_file(iso_month: str, zip_file_path: str = None):
+def download_gpad_zip_file(
+    iso_month: str, zip_file_path: str = None, session: requests.Session = None, segments: int = 1
+):
     """
     Download the GPAD suppliers zip data for a given month
     from the NHS Digital website
+
+    A partial download left by an interrupted run is resumed rather than restarted.
     
     Args:
         iso_month: ISO month string (e.g. "2025-01")
         zip_file_path: Optional direct URL to zip file
+        session: Optional HTTP session (default: a new pooled session with retries)
+        segments: Parallel range requests to download the zip with, if the server supports them
     """
+    if session is None:
+        session = create_session()
+
     # Ensure tmp directory exists
     os.makedirs(TMP_DIR, exist_ok=True)
     
@@ -118,7 +161,7 @@ def download_gpad_zip_file(iso_month: str, zip_file_path: str = None):
 
     if zip_file_path is None:
         logger.info(f"Finding download link for {iso_month} from {url}")
-        response = requests.get(url)
+        response = session.get(url)
         response.raise_for_status()
 
         try:
@@ -132,15 +175,21 @@ def download_gpad_zip_file(iso_month: str, zip_file_path: str = None):
         download_link = zip_file_path
 
     logger.info(f"Downloading zip file from {download_link}")
-    response = requests.get(download_link)
-    response.raise_for_status()
-
     zip_path = os.path.join(TMP_DIR, f"{iso_month}.zip")
-    with open(zip_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+    download = download_file(
+        download_link,
+        zip_path,
+        session,
+        progress_callback=create_progress_logger(f"Downloading {iso_month}.zip"),
+        segments=segments,
+    )
 
-    logger.info(f"Downloaded zip file to {zip_path}")
+    if download["resumed_from"]:
+        logger.info(f"Resumed a partial download ({format_bytes(download['resumed_from'])} already on disk)")
+    logger.info(
+        f"Downloaded zip file to {zip_path} ({format_bytes(download['size'])} in {download['seconds']:.1f}s, "
+        f"sha256 {download['sha256']})"
+    )
 
 
 def get_download_link_from_response(response: requests.Response):
@@ -192,41 +241,95 @@ def unzip_gpad_zip_file(month: str):
     return unzip_dir
 
 
-def process_data_files(input_file_paths: list[str]):
+def process_data_files(input_file_paths: list[str], workers: int = 1):
     """
     Process CSV data files to extract GP supplier information
     
     Args:
         input_file_paths: List of paths to CSV files
+        workers: Processes to parse the files in (1 to parse them in this process)
         
     Returns:
         Tuple of (data dict, gp_code_to_name dict)
     """
+    if workers > 1 and len(input_file_paths) > 1:
+        return process_data_files_in_parallel(input_file_paths, workers)
+
     data = {}
     gp_code_to_name = {}
 
     for input_file_path in input_file_paths:
         logger.info(f"Processing data file: {input_file_path}")
         with open(input_file_path, "r", encoding="utf-8") as file:
-            reader = csv.reader(file)
-            for index, row in enumerate(reader):
-                if index == 0:
-                    continue
-
-                # CSV format: [?, GP_ODS_CODE, GP_NAME, APPOINTMENTS_SYSTEMS, ...]
-                if len(row) < 4:
-                    continue
-                    
-                gp_code = row[1]
-                gp_name = row[2]
-                appointments_systems = row[3]
-                
-                main_system = get_main_system_from_value(appointments_systems)
+            process_data_file(file, data, gp_code_to_name)
+
+    # Sort the data alphabetically by GP code
+    # to ensure the output file can be compared more easily over time
+    data = dict(sorted(data.items()))
+
+    return data, gp_code_to_name
+
+
+def process_zip_data_files(zip_path: str, member_names: list[str], workers: int = 1):
+    """
+    Process CSV data files straight out of the zip, without extracting them
+
+    Each member is decompressed as it is read, so nothing is written to disk.
+
+    Args:
+        zip_path: Path to the downloaded zip file
+        member_names: Names of the CSV files inside the zip
+        workers: Processes to parse the files in (1 to parse them in this process)
+
+    Returns:
+        Tuple of (data dict, gp_code_to_name dict)
+    """
+    if workers > 1 and len(member_names) > 1:
+        return process_data_files_in_parallel(member_names, workers, zip_path)
+
+    data = {}
+    gp_code_to_name = {}
+
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        for member_name in member_names:
+            logger.info(f"Processing data file: {member_name} (in {zip_path})")
+            with zip_ref.open(member_name) as member:
+                file = io.TextIOWrapper(member, encoding="utf-8", newline="")
+                process_data_file(file, data, gp_code_to_name)
+
+    # Sort the data alphabetically by GP code
+    # to ensure the output file can be compared more easily over time
+    data = dict(sorted(data.items()))
+
+    return data, gp_code_to_name
+
+
+def process_data_files_in_parallel(input_file_paths: list[str], workers: int, zip_path: str = None):
+    """
+    Parse each data file in its own worker process and merge the results
+
+    Partials are merged in file order, and a GP code keeps the values from
+    the first file (and row) it appears in, exactly as in sequential processing.
+
+    Args:
+        input_file_paths: Paths to CSV files, or member names if zip_path is given
+        workers: Maximum worker processes
+        zip_path: Path to a zip file to read the members from, if not extracted
+
+    Returns:
+        Tuple of (data dict, gp_code_to_name dict)
+    """
+    data = {}
+    gp_code_to_name = {}
 
+    logger.info(f"Processing {len(input_file_paths)} data files in {min(workers, len(input_file_paths))} processes")
+    with ProcessPoolExecutor(max_workers=min(workers, len(input_file_paths))) as executor:
+        partials = executor.map(parse_data_file, input_file_paths, [zip_path] * len(input_file_paths))
+        for input_file_path, partial in zip(input_file_paths, partials):
+            logger.info(f"Processed data file: {input_file_path} ({len(partial)} GP practices)")
+            for gp_code, (appointments_systems, main_system, gp_name) in partial.items():
                 if gp_code not in data:
                     data[gp_code] = (appointments_systems, main_system)
-
-                if gp_code not in gp_code_to_name:
                     gp_code_to_name[gp_code] = gp_name
 
     # Sort the data alphabetically by GP code
@@ -236,10 +339,91 @@ def process_data_files(input_file_paths: list[str]):
     return data, gp_code_to_name
 
 
+def parse_data_file(input_file_path: str, zip_path: str = None):
+    """
+    Parse one data file into a compact partial result (runs in a worker process)
+
+    Args:
+        input_file_path: Path to the CSV file, or its member name if zip_path is given
+        zip_path: Path to a zip file to read the member from, if not extracted
+
+    Returns:
+        Dictionary of GP codes to (appointment systems, main system, GP name),
+        from the first row each code appears in
+    """
+    data = {}
+    gp_code_to_name = {}
+
+    if zip_path:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref, zip_ref.open(input_file_path) as member:
+            process_data_file(io.TextIOWrapper(member, encoding="utf-8", newline=""), data, gp_code_to_name)
+    else:
+        with open(input_file_path, "r", encoding="utf-8") as file:
+            process_data_file(file, data, gp_code_to_name)
+
+    return {
+        gp_code: (appointments_systems, main_system, gp_code_to_name[gp_code])
+        for gp_code, (appointments_systems, main_system) in data.items()
+    }
+
+
+def process_data_file(file, data: dict, gp_code_to_name: dict):
+    """
+    Add the GP practices in one Practice Level Crosstab file
+
+    The first row seen for each GP code wins. The crosstabs have many rows
+    per practice, so each line is only split as far as the GP code (column 1)
+    first, and lines for practices already seen are skipped without parsing
+    the rest of the row. Lines containing quotes are only parsed with the csv
+    module when the quoting could affect the GP code or span several lines.
+
+    Args:
+        file: The CSV file, open for reading as text
+        data: Dictionary of GP codes to (appointment systems, main system), updated in place
+        gp_code_to_name: Dictionary of GP codes to names, updated in place
+    """
+    lines = iter(file)
+    next(lines, None)  # Skip the header
+
+    for line in lines:
+        # CSV format: [?, GP_ODS_CODE, GP_NAME, APPOINTMENTS_SYSTEMS, ...]
+        quote_position = line.find('"')
+        if quote_position == -1:
+            prefix = line.split(",", 2)
+            if len(prefix) < 3 or prefix[1] in data:
+                continue
+            row = line.rstrip("\r\n").split(",", 4)
+        else:
+            prefix = line[:quote_position].split(",", 2)
+            if len(prefix) == 3 and prefix[1] in data and line.count('"') % 2 == 0:
+                # The GP code comes before any quoted field, and no field spans lines
+                continue
+            # Let the csv module read the whole record, which may continue onto the next lines
+            row = next(csv.reader(chain([line], lines)), [])
+
+        if len(row) < 4:
+            continue
+
+        gp_code = row[1]
+        gp_name = row[2]
+        appointments_systems = row[3]
+
+        main_system = get_main_system_from_value(appointments_systems)
+
+        if gp_code not in data:
+            data[gp_code] = (appointments_systems, main_system)
+
+        if gp_code not in gp_code_to_name:
+            gp_code_to_name[gp_code] = gp_name
+
+
 def write_output_file(data: dict, gp_code_to_name: dict, output_file: str):
     """
     Write the output CSV file with GP supplier mappings
 
+    A sidecar index of row offsets by GP code and system is written alongside
+    it in the same pass (see helpers.write_indexed_csv).
+
     Args:
         data: A dictionary of GP codes to their appointment systems and main system
         gp_code_to_name: A dictionary of GP codes to their names
@@ -248,13 +432,17 @@ def write_output_file(data: dict, gp_code_to_name: dict, output_file: str):
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     
-    with open(output_file, "w", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        writer.writerow(["GP_ODS_CODE", "GP_NAME", "GP_GPAD_SYSTEMS", "GP_SYSTEM"])
-        for gp_code, (appointment_systems, main_system) in data.items():
-            writer.writerow(
-                [gp_code, gp_code_to_name[gp_code], appointment_systems, main_system]
-            )
+    rows = (
+        [gp_code, gp_code_to_name[gp_code], appointment_systems, main_system]
+        for gp_code, (appointment_systems, main_system) in data.items()
+    )
+    write_indexed_csv(
+        output_file,
+        ["GP_ODS_CODE", "GP_NAME", "GP_GPAD_SYSTEMS", "GP_SYSTEM"],
+        rows,
+        key_column="GP_ODS_CODE",
+        group_columns=["GP_SYSTEM"],
+    )
     logger.info(f"Written output file: {output_file}")
 
 
@@ -295,6 +483,44 @@ if __name__ == "__main__":
         required=False,
     )
 
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="Seconds to wait for NHS Digital to connect or respond (default: 10 to connect, 60 between bytes)",
+        default=None,
+        required=False,
+    )
+
+    parser.add_argument(
+        "--retries",
+        type=int,
+        help=f"Retries of connection errors and 5xx responses (default: {DEFAULT_RETRIES})",
+        default=DEFAULT_RETRIES,
+        required=False,
+    )
+
+    parser.add_argument(
+        "--segments",
+        type=int,
+        help="Parallel range requests to download the zip with, if the server supports them (default: 1)",
+        default=1,
+        required=False,
+    )
+
+    parser.add_argument(
+        "--extract",
+        action="store_true",
+        help="Extract the whole zip to .tmp/<month>/ before processing, instead of reading it in place",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes to parse the regional data files in, one file each (default: 1)",
+        default=1,
+        required=False,
+    )
+
     args = parser.parse_args()
 
     # If no month is provided, use the previous month
@@ -302,4 +528,7 @@ if __name__ == "__main__":
         args.month = (datetime.now() - relativedelta(months=1)).strftime("%Y-%m")
         logger.info(f"No month specified, using previous month: {args.month}")
 
-    main(args.month, args.zip_file)
+    session_options = {"timeout": args.timeout} if args.timeout else {}
+    session = create_session(pool_size=max(args.segments, 1), retries=args.retries, **session_options)
+
+    main(args.month, args.zip_file, session, args.segments, args.extract, args.workers)
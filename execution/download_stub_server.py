@@ -0,0 +1,230 @@
+"""
+Local Stand-in for the NHS Digital file server
+
+Serves the files in a directory over HTTP with the features resumable
+downloads depend on: byte Range requests (206 Partial Content, 416 when
+out of range), If-Range, ETag/Last-Modified validators and Content-Length.
+Resuming and segmented downloads (see file_download.py) can then be
+exercised offline.
+
+To simulate unreliable networks, the first --drops responses are cut off
+after --drop-after bytes by closing the connection. --bandwidth caps each
+connection's throughput, and --no-ranges makes the server ignore Range
+headers like a server without range support.
+
+Usage:
+    python execution/download_stub_server.py --directory .tmp/stub_files --port 8799 --drop-after 1000000
+    python execution/download_gpad.py --month 2025-01 --zip-file http://127.0.0.1:8799/2025-01.zip
+"""
+
+import argparse
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import re
+import sys
+import threading
+import time
+from urllib.parse import unquote
+
+
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8799
+
+# Bytes written to the socket at a time
+SEND_CHUNK_SIZE = 64 * 1024
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def get_etag(stat: os.stat_result):
+    """Get a strong ETag for a file version, from its size and modification time"""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(value: str, size: int):
+    """
+    Parse a single-range Range header
+
+    Args:
+        value: The header value (e.g. "bytes=100-199", "bytes=100-" or "bytes=-100")
+        size: Size of the file in bytes
+
+    Returns:
+        (first byte, last byte) to send, "unsatisfiable" if the range is outside
+        the file, or None to ignore the header and send the whole file
+    """
+    match = RANGE_PATTERN.match(value.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # A suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        return "unsatisfiable"
+    return first, last
+
+
+class DownloadRequestHandler(BaseHTTPRequestHandler):
+    """Serves files from the server's directory, honouring Range requests"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_HEAD(self):
+        self.send_file(head_only=True)
+
+    def do_GET(self):
+        self.send_file(head_only=False)
+
+    def send_file(self, head_only: bool):
+        stub = self.server
+        stub.count_request()
+
+        name = unquote(self.path.split("?", 1)[0]).lstrip("/")
+        file_path = os.path.realpath(os.path.join(stub.directory, name))
+        if not file_path.startswith(stub.directory + os.sep) or not os.path.isfile(file_path):
+            self.send_error(404, "File not found")
+            return
+
+        stat = os.stat(file_path)
+        size = stat.st_size
+        etag = get_etag(stat)
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+        byte_range = None
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and stub.serve_ranges and (not if_range or if_range in (etag, last_modified)):
+            byte_range = parse_range(range_header, size)
+
+        if byte_range == "unsatisfiable":
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        first, last = byte_range or (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(last - first + 1))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        if stub.serve_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {first}-{last}/{size}")
+        self.end_headers()
+        if head_only:
+            return
+
+        drop_after = stub.take_drop()
+        sent = 0
+        started = time.monotonic()
+        with open(file_path, "rb") as f:
+            f.seek(first)
+            remaining = last - first + 1
+            while remaining > 0:
+                chunk = f.read(min(SEND_CHUNK_SIZE, remaining))
+                if drop_after is not None and sent + len(chunk) > drop_after:
+                    self.wfile.write(chunk[:drop_after - sent])
+                    self.wfile.flush()
+                    # Cut the response short, like a dropped connection
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                remaining -= len(chunk)
+                if stub.bandwidth:
+                    delay = sent / stub.bandwidth - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+
+class DownloadStubServer(ThreadingHTTPServer):
+    """Threaded HTTP file server holding the stand-in's settings and counters"""
+
+    daemon_threads = True
+
+    def __init__(self, directory=".", port=STUB_PORT, drop_after=None, drops=1, bandwidth=0,
+                 serve_ranges=True, verbose=False):
+        super().__init__((STUB_HOST, port), DownloadRequestHandler)
+        self.directory = os.path.realpath(directory)
+        self.drop_after = drop_after
+        self.drops_left = drops if drop_after is not None else 0
+        self.bandwidth = bandwidth
+        self.serve_ranges = serve_ranges
+        self.verbose = verbose
+        self.request_count = 0
+        self.counter_lock = threading.Lock()
+
+    def count_request(self):
+        with self.counter_lock:
+            self.request_count += 1
+
+    def take_drop(self):
+        """Get the byte count to cut the next response off at, or None to send it whole"""
+        with self.counter_lock:
+            if self.drops_left <= 0:
+                return None
+            self.drops_left -= 1
+            return self.drop_after
+
+    def get_url(self, name: str):
+        """The URL a file in the directory is served at"""
+        return f"http://{STUB_HOST}:{self.server_address[1]}/{name}"
+
+
+def start_download_stub_server(**kwargs):
+    """
+    Start a stand-in file server on a background thread
+
+    Args:
+        **kwargs: DownloadStubServer settings (port=0 picks a free port)
+
+    Returns:
+        The running DownloadStubServer; call shutdown() and server_close() when done
+    """
+    server = DownloadStubServer(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve files over HTTP with Range support, to test resumable downloads"
+    )
+
+    parser.add_argument("--directory", type=str, default=".", help="Directory to serve (default: current)")
+    parser.add_argument("--port", type=int, default=STUB_PORT, help=f"Port to listen on (default: {STUB_PORT})")
+    parser.add_argument("--drop-after", type=int, default=None, help="Close connections after sending this many body bytes")
+    parser.add_argument("--drops", type=int, default=1, help="Number of responses to cut short with --drop-after (default: 1)")
+    parser.add_argument("--bandwidth", type=float, default=0, help="Bytes/second per connection; 0 for unlimited (default: 0)")
+    parser.add_argument("--no-ranges", action="store_true", help="Ignore Range headers and always send the whole file")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+
+    args = parser.parse_args()
+
+    server = DownloadStubServer(
+        args.directory, args.port, args.drop_after, args.drops, args.bandwidth,
+        not args.no_ranges, args.verbose,
+    )
+    print(f"Serving {server.directory} at {server.get_url('')}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -3,13 +3,27 @@ GP Data Enrichment Script
 
 Enriches the GP suppliers data with ICB Sub location information.
 1. Reads execution/data/gp_suppliers.csv
-2. Checks execution/data/GP to ICB Sub location - Map.csv
-3. If missing, queries NHS ODS API for 'Commissioned By' relationship
-4. Updates the Map csv
-5. Outputs execution/data/icb_gp_suppliers.csv
+2. Checks the GP to ICB Sub location map store (execution/data/GP to ICB Sub location - Map.db),
+   after merging in any changes to execution/data/GP to ICB Sub location - Map.csv
+3. If missing (and not recently failed), queries NHS ODS API for 'Commissioned By'
+   relationship (concurrently, with a shared rate limit across all workers)
+4. Checkpoints new codes and failed lookups to the map store as it goes, and re-exports the Map csv
+5. Streams execution/data/icb_gp_suppliers.csv, joining each row against the map as it
+   is read, so memory doesn't grow with the size of the input
+
+If a run is interrupted, re-run it with --resume to carry on without
+repeating the lookups it had already checkpointed.
+
+Usage:
+    python execution/enrich_gp_data.py --month 2025-01
+    python execution/enrich_gp_data.py --month 2025-01 --workers 8 --requests-per-second 5
+    python execution/enrich_gp_data.py --month 2025-01 --resume
+    python execution/enrich_gp_data.py --month 2025-01 --plan
+    python execution/enrich_gp_data.py --input-file all_practices.csv --output-file icb_all_practices.csv --no-index
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import csv
 import json
 import logging
@@ -20,6 +34,15 @@ from datetime import datetime
 from dateutil.relativedelta import relativedelta
 import requests
 
+# Add execution directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from helpers import write_indexed_csv
+from http_session import DEFAULT_RETRIES, create_session, get_session
+from map_store import MAP_DB_FILE, CommissionerMapStore
+from ods_response_cache import DEFAULT_MAX_BYTES, RESPONSE_CACHE_DIR, ODSResponseCache
+from rate_control import DEFAULT_RETRY_AFTER, TokenBucketRateLimiter, parse_retry_after
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -32,50 +55,116 @@ logger = logging.getLogger(__name__)
 MAP_FILE = "execution/data/GP to ICB Sub location - Map.csv"
 ODS_API_URL = "https://directory.spineservices.nhs.uk/ORD/2-0-0/organisations"
 RATE_LIMIT_DELAY = 0.2  # Seconds between API calls
+DEFAULT_WORKERS = 4  # Concurrent API requests in flight
+MAX_RETRIES = 5  # Retries of a rate limited (429) request before giving up
+TYPICAL_RESPONSE_SECONDS = 0.3  # ODS API response time assumed when estimating run time
+CHECKPOINT_BATCH_SIZE = 100  # Lookups saved per map store transaction
+CHECKPOINT_INTERVAL = 5  # Maximum seconds between checkpoints while lookups are completing
+NEGATIVE_CACHE_DAYS = 90  # Days before a code that failed to resolve is looked up again
+
+# Reasons a lookup failed that are remembered in the negative cache.
+# Network errors and exhausted 429 retries aren't cached, so they are retried next run.
+FAILURE_NOT_FOUND = "not_found"  # The API answered 404
+FAILURE_NO_COMMISSIONER = "no_commissioner"  # No active RE4 'Commissioned By' relationship
+FAILURE_PARSE_ERROR = "parse_error"  # The response couldn't be read
+
+def read_ods_codes(input_file):
+    """
+    Read the distinct ODS codes in a GP suppliers CSV, in first-seen order.
+
+    Only the codes are kept, so memory grows with the number of practices,
+    not the number of rows.
+    """
+    with open(input_file, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        code_position = next(reader).index('GP_ODS_CODE')
+        return list(dict.fromkeys(row[code_position] for row in reader if row))
 
-def load_map(map_file):
-    """Load the GP to ICB map into a dictionary."""
-    mapping = {}
-    if not os.path.exists(map_file):
-        logger.warning(f"Map file {map_file} not found. Starting with empty map.")
-        return mapping
+def enrich_rows(input_file, ods_map):
+    """
+    Stream the rows of a GP suppliers CSV with their ICB Sub location prepended.
 
-    with open(map_file, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
+    A hash join against ods_map (ODS code -> ICB code); codes that aren't
+    mapped get "UNKNOWN". The first row yielded is the header.
+    """
+    with open(input_file, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        code_position = header.index('GP_ODS_CODE')
+        yield ['ICB Sub location'] + header
         for row in reader:
-            # Map file has ICB Sub location,GP_ODS_CODE
-            # distinct from the order, we want ODS -> ICB
-            if 'GP_ODS_CODE' in row and 'ICB Sub location' in row:
-                mapping[row['GP_ODS_CODE']] = row['ICB Sub location']
-    return mapping
-
-def append_to_map(map_file, ods_code, icb_code):
-    """Append a new mapping to the CSV file."""
-    file_exists = os.path.exists(map_file)
-    with open(map_file, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-             writer.writerow(['ICB Sub location', 'GP_ODS_CODE'])
-        writer.writerow([icb_code, ods_code])
-
-def get_commissioner_code(ods_code):
+            if row:
+                yield [ods_map.get(row[code_position]) or "UNKNOWN"] + row
+
+def estimate_lookup_seconds(code_count, workers=DEFAULT_WORKERS, requests_per_second=1 / RATE_LIMIT_DELAY):
+    """
+    Estimate how long looking up code_count codes will take.
+
+    Lookups go no faster than the rate limit, or than the workers can
+    complete requests of TYPICAL_RESPONSE_SECONDS each.
+    """
+    rate = workers / TYPICAL_RESPONSE_SECONDS
+    if requests_per_second > 0:
+        rate = min(rate, requests_per_second)
+    return code_count / rate
+
+def get_commissioner_code(ods_code, api_url=ODS_API_URL, rate_limiter=None, session=None,
+                          response_cache=None):
     """
     Query NHS ODS API to find the commissioner code for a GP practice.
     Looking for 'Commissioned By' relationship (RE4).
+
+    If a rate_limiter is given, every request waits for it and reports
+    back whether it was throttled, so the shared rate adapts to 429s.
+    Requests go through `session` (default: the shared pooled session).
+    If a response_cache is given, the full organisation JSON is kept in it.
     """
-    url = f"{ODS_API_URL}/{ods_code}"
+    icb_code, _ = lookup_commissioner_code(ods_code, api_url, rate_limiter, session, response_cache)
+    return icb_code
+
+def lookup_commissioner_code(ods_code, api_url=ODS_API_URL, rate_limiter=None, session=None,
+                             response_cache=None):
+    """
+    Like get_commissioner_code, but also says why a lookup failed.
+
+    Returns (icb_code, None) on success, (None, FAILURE_*) for a failure worth
+    remembering, or (None, None) for one that should just be retried.
+    """
+    url = f"{api_url}/{ods_code}"
+    session = session or get_session()
     try:
-        response = requests.get(url)
-        if response.status_code == 429:
-            logger.warning("Rate limit hit. Waiting 5 seconds...")
-            time.sleep(5)
-            response = requests.get(url)
+        for attempt in range(MAX_RETRIES + 1):
+            if rate_limiter:
+                rate_limiter.acquire()
+            response = session.get(url)
+            if response.status_code != 429:
+                if rate_limiter:
+                    rate_limiter.on_success()
+                break
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if rate_limiter:
+                rate_limiter.on_throttle(retry_after)
+                logger.warning(f"Rate limit hit for {ods_code}. Slowing to {rate_limiter.rate:.2f} requests/second...")
+            else:
+                delay = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+                logger.warning(f"Rate limit hit. Waiting {delay:g} seconds...")
+                time.sleep(delay)
+        else:
+            logger.error(f"Still rate limited for {ods_code} after {MAX_RETRIES} retries.")
+            return None, None
         
         if response.status_code == 404:
             logger.warning(f"ODS Code {ods_code} not found in API.")
-            return None
+            return None, FAILURE_NOT_FOUND
             
         response.raise_for_status()
+        if response_cache:
+            try:
+                response_cache.put(ods_code, response.content)
+            except Exception as e:
+                # The response is still good; only the cached copy is lost
+                logger.warning(f"Could not cache the API response for {ods_code}: {e}")
         data = response.json()
         
         # Check relationships
@@ -98,21 +187,89 @@ def get_commissioner_code(ods_code):
                         target = rel.get('Target')
                         if target:
                             org_id = target.get('OrgId', {})
-                            if isinstance(org_id, dict):
-                                return org_id.get('extension')
+                            if isinstance(org_id, dict) and org_id.get('extension'):
+                                return org_id['extension'], None
         
-        return None
+        return None, FAILURE_NO_COMMISSIONER
 
     except requests.exceptions.RequestException as e:
         logger.error(f"API Request failed for {ods_code}: {e}")
-        return None
+        return None, None
     except Exception as e:
         logger.error(f"Error parsing API response for {ods_code}: {e}")
-        return None
+        return None, FAILURE_PARSE_ERROR
+
+def resolve_commissioner_codes(ods_codes, workers=DEFAULT_WORKERS, rate_limiter=None,
+                               api_url=ODS_API_URL, session=None, response_cache=None):
+    """
+    Look up the commissioner codes for many GP practices concurrently.
+
+    Up to `workers` API requests are in flight at once, all drawing from one
+    shared rate_limiter (default: the fixed RATE_LIMIT_DELAY rate) and one
+    session's connection pool (default: a new pool with a connection per worker).
+    Responses are kept in response_cache, if given.
+    Yields (ods_code, icb_code or None, failure reason or None) in completion order.
+    """
+    if rate_limiter is None:
+        rate_limiter = TokenBucketRateLimiter(1 / RATE_LIMIT_DELAY)
+    if session is None:
+        session = create_session(pool_size=workers)
+
+    def resolve(ods_code):
+        return (ods_code, *lookup_commissioner_code(ods_code, api_url, rate_limiter, session, response_cache))
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(resolve, ods_code) for ods_code in ods_codes]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # If the caller stops early (e.g. on Ctrl-C), only wait for the requests already in flight
+        executor.shutdown(wait=True, cancel_futures=True)
 
 def main():
     parser = argparse.ArgumentParser(description="Enrich GP supplier data with ICB information")
     parser.add_argument("--month", type=str, help="The month of the data to process (e.g. 2025-01)")
+    parser.add_argument("--input-file", type=str, default=None,
+                        help="GP suppliers CSV to enrich (default: execution/data/gp_suppliers_<month>.csv)")
+    parser.add_argument("--output-file", type=str, default=None,
+                        help="Enriched CSV to write (default: execution/data/icb_gp_suppliers_<month>.csv)")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Don't write the sidecar row index, which grows with the number of rows "
+                             "(for very large inputs that gp_lookup.py won't query)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Maximum concurrent ODS API requests (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--requests-per-second", type=float, default=1 / RATE_LIMIT_DELAY,
+                        help=f"Starting ODS API request rate across all workers (default: {1 / RATE_LIMIT_DELAY:g})")
+    parser.add_argument("--max-requests-per-second", type=float, default=None,
+                        help="Rate the limiter may probe up to while the API accepts requests "
+                             "(default: the starting rate). It is halved on every 429.")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Seconds to wait for the ODS API to connect or respond (default: 10 to connect, 60 to respond)")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help=f"Retries of ODS API connection errors and 5xx responses (default: {DEFAULT_RETRIES})")
+    parser.add_argument("--ods-api-url", type=str, default=ODS_API_URL,
+                        help="ODS organisations endpoint (e.g. a local stand-in server for testing)")
+    parser.add_argument("--map-file", type=str, default=MAP_FILE,
+                        help="GP to ICB Sub location map CSV to read and update")
+    parser.add_argument("--map-db", type=str, default=MAP_DB_FILE,
+                        help="SQLite map store kept in sync with the map CSV")
+    parser.add_argument("--response-cache-dir", type=str, default=RESPONSE_CACHE_DIR,
+                        help="Directory to keep the full ODS API response for every practice looked up")
+    parser.add_argument("--response-cache-mb", type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="Size limit of the response cache; the least recently used responses are "
+                             f"evicted beyond it (default: {DEFAULT_MAX_BYTES // (1024 * 1024)})")
+    parser.add_argument("--no-response-cache", action="store_true",
+                        help="Don't keep ODS API responses")
+    parser.add_argument("--negative-cache-days", type=float, default=NEGATIVE_CACHE_DAYS,
+                        help="Days to skip codes that failed to resolve (404, no RE4 or unreadable "
+                             "response) before looking them up again; 0 to retry every run "
+                             f"(default: {NEGATIVE_CACHE_DAYS})")
+    parser.add_argument("--plan", action="store_true",
+                        help="Report how many codes need looking up and roughly how long it will take, "
+                             "without calling the API or writing any output")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run with the same output file, skipping codes it already looked up")
     args = parser.parse_args()
 
     # If no month is provided, use the previous month
@@ -121,61 +278,162 @@ def main():
         logger.info(f"No month specified, using previous month: {args.month}")
     
     month = args.month
-    gp_suppliers_file = f"execution/data/gp_suppliers_{month}.csv"
-    output_file = f"execution/data/icb_gp_suppliers_{month}.csv"
+    gp_suppliers_file = args.input_file or f"execution/data/gp_suppliers_{month}.csv"
+    output_file = args.output_file or f"execution/data/icb_gp_suppliers_{month}.csv"
 
-    logger.info(f"Starting enrichment process for {month}...")
+    logger.info(f"Starting enrichment process for {gp_suppliers_file}...")
     
     # 1. Load Data
     if not os.path.exists(gp_suppliers_file):
         logger.error(f"{gp_suppliers_file} not found. Ensure the download script has been run for this month.")
         sys.exit(1)
         
-    ods_map = load_map(MAP_FILE)
-    logger.info(f"Loaded {len(ods_map)} mappings.")
+    # --plan works on an in-memory copy of the store, so applying the CSV to it
+    # gives the same plan as a real run without writing anything
+    map_store = CommissionerMapStore(args.map_db, read_only=args.plan)
+    imported = map_store.sync_from_csv(args.map_file)
+    if imported and not args.plan:
+        logger.info(f"Merged {imported} mappings from {args.map_file} into the map store.")
+    logger.info(f"Map store has {map_store.count()} mappings.")
+    negative_cache_ttl = args.negative_cache_days * 24 * 60 * 60
+    if negative_cache_ttl > 0 and not args.plan:
+        map_store.purge_failures(negative_cache_ttl)
     
-    processed_count = 0
-    api_calls = 0
+    run_key = f"enrich:{os.path.abspath(output_file)}"
+    checkpointed_codes = map_store.get_checkpoint(run_key)
+    if args.resume:
+        if checkpointed_codes:
+            logger.info(f"Resuming run for {output_file}: {len(checkpointed_codes)} codes already looked up.")
+        else:
+            logger.info(f"No checkpoint to resume for {output_file}; starting a new run.")
+    elif checkpointed_codes:
+        if not args.plan:
+            logger.warning(f"Discarding the checkpoint of an unfinished run for {output_file} "
+                           f"({len(checkpointed_codes)} codes). Use --resume to continue a run instead.")
+            map_store.clear_checkpoint(run_key)
+        checkpointed_codes = set()
     
-    new_rows = []
+    api_calls = 0
+    new_mapping_count = 0
+    unsaved_codes = []
+    unsaved_mappings = []
+    unsaved_failures = []
     
-    with open(gp_suppliers_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        fieldnames = ['ICB Sub location'] + reader.fieldnames
-        
-        for row in reader:
-            ods_code = row['GP_ODS_CODE']
-            icb_code = ods_map.get(ods_code)
-            
-            if not icb_code:
-                logger.info(f"Lookup code for {ods_code}...")
-                icb_code = get_commissioner_code(ods_code)
+    ods_codes = read_ods_codes(gp_suppliers_file)
+    ods_map = map_store.get_many(ods_codes)
+
+    # 2/3. Plan the lookups before any network call: the codes missing from the map,
+    # less those that failed recently or were looked up before a resume
+    unmapped_codes = [ods_code for ods_code in ods_codes if not ods_map.get(ods_code)]
+    known_failures = map_store.get_failures(unmapped_codes, negative_cache_ttl)
+    if known_failures:
+        reason_counts = {}
+        for reason in known_failures.values():
+            reason_counts[reason] = reason_counts.get(reason, 0) + 1
+        logger.info(f"Skipping {len(known_failures)} codes that failed in the last "
+                    f"{args.negative_cache_days:g} days: "
+                    + ", ".join(f"{count} {reason}" for reason, count in sorted(reason_counts.items())))
+    missing_codes = [
+        ods_code for ods_code in unmapped_codes
+        if ods_code not in known_failures and ods_code not in checkpointed_codes
+    ]
+    estimated_seconds = estimate_lookup_seconds(len(missing_codes), args.workers, args.requests_per_second)
+
+    if args.plan:
+        print(f"Practices:                 {len(ods_codes)}")
+        print(f"Already mapped:            {len(ods_codes) - len(unmapped_codes)}")
+        print(f"Recently failed (skipped): {len(known_failures)}")
+        print(f"Checkpointed (skipped):    {len((checkpointed_codes & set(unmapped_codes)) - known_failures.keys())}")
+        print(f"To look up:                {len(missing_codes)}")
+        print(f"Estimated API time:        {estimated_seconds:.0f}s "
+              f"({args.workers} workers, up to {args.requests_per_second:g} requests/second)")
+        map_store.close()
+        return
+
+    # Fast path: with nothing to look up, the output is just a join against the map
+    if missing_codes:
+        rate_limiter = TokenBucketRateLimiter(args.requests_per_second, args.max_requests_per_second)
+        session_options = {'timeout': args.timeout} if args.timeout else {}
+        session = create_session(pool_size=args.workers, retries=args.retries, **session_options)
+        response_cache = None
+        if not args.no_response_cache:
+            response_cache = ODSResponseCache(args.response_cache_dir, int(args.response_cache_mb * 1024 * 1024))
+        logger.info(f"Looking up {len(missing_codes)} codes with {args.workers} workers "
+                    f"at up to {args.requests_per_second:g} requests/second (estimated {estimated_seconds:.0f}s)...")
+
+        last_checkpoint = time.monotonic()
+        try:
+            for ods_code, icb_code, failure_reason in resolve_commissioner_codes(
+                missing_codes, args.workers, rate_limiter, args.ods_api_url, session, response_cache
+            ):
                 api_calls += 1
-                time.sleep(RATE_LIMIT_DELAY)
-                
+                if icb_code or failure_reason:
+                    # Transient failures (network errors, exhausted 429 retries) aren't
+                    # checkpointed, so a resumed run looks them up again
+                    unsaved_codes.append(ods_code)
                 if icb_code:
                     logger.info(f"Found code {icb_code} for {ods_code}.")
                     ods_map[ods_code] = icb_code
-                    append_to_map(MAP_FILE, ods_code, icb_code)
+                    new_mapping_count += 1
+                    unsaved_mappings.append((ods_code, icb_code))
                 else:
                     logger.warning(f"Could not find ICB code for {ods_code}")
-                    icb_code = "UNKNOWN"
-            
-            row['ICB Sub location'] = icb_code
-            new_rows.append(row)
-            processed_count += 1
-            
-            if processed_count % 100 == 0:
-                logger.info(f"Processed {processed_count} records...")
+                    if failure_reason:
+                        unsaved_failures.append((ods_code, failure_reason))
 
-    # Output
+                if (len(unsaved_codes) >= CHECKPOINT_BATCH_SIZE
+                        or time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL):
+                    map_store.save_checkpoint(run_key, unsaved_codes, unsaved_mappings, unsaved_failures)
+                    unsaved_codes, unsaved_mappings, unsaved_failures = [], [], []
+                    last_checkpoint = time.monotonic()
+
+                if api_calls % 100 == 0:
+                    logger.info(f"Looked up {api_calls} of {len(missing_codes)} codes "
+                                f"(now {rate_limiter.rate:.2f} requests/second)...")
+        except KeyboardInterrupt:
+            logger.warning(f"Interrupted after {api_calls} lookups. "
+                           f"Re-run with the same arguments and --resume to continue.")
+            sys.exit(1)
+        finally:
+            # Keep every completed lookup, even if the run is stopping early
+            map_store.save_checkpoint(run_key, unsaved_codes, unsaved_mappings, unsaved_failures)
+            if response_cache:
+                response_cache.close()
+
+        if rate_limiter.throttled_count:
+            logger.info(f"Rate limited {rate_limiter.throttled_count} times; "
+                        f"finished at {rate_limiter.rate:.2f} requests/second.")
+
+    # 4. Publish new codes (including any from an interrupted run) to the map CSV
+    if new_mapping_count:
+        logger.info(f"Added {new_mapping_count} mappings.")
+    if map_store.is_csv_out_of_date():
+        logger.info(f"Updating {args.map_file}...")
+        map_store.export_csv(args.map_file)
+
+    # Output, streamed a row at a time from the input
     logger.info(f"Writing result to {output_file}...")
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(new_rows)
+    enriched_rows = enrich_rows(gp_suppliers_file, ods_map)
+    fieldnames = next(enriched_rows)
+    if args.no_index:
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            writer.writerows(enriched_rows)
+    else:
+        write_indexed_csv(
+            output_file,
+            fieldnames,
+            enriched_rows,
+            key_column='GP_ODS_CODE',
+            group_columns=['GP_SYSTEM', 'ICB Sub location'],
+        )
+
+    # The run is complete, so the next one starts afresh
+    map_store.clear_checkpoint(run_key)
+    map_store.close()
         
-    logger.info(f"Enrichment complete for {month}.")
+    logger.info(f"Enrichment complete for {gp_suppliers_file}.")
 
 if __name__ == "__main__":
     main()
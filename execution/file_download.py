@@ -0,0 +1,462 @@
+"""
+Streaming, resumable file downloads
+
+Downloads large files (e.g. the GPAD Annex 1 zip) in fixed-size chunks
+straight to disk, so memory use stays flat however big the file is. The
+SHA-256 of the file is computed as it is written, and progress is reported
+to a callback as the chunks arrive.
+
+The file is written to `<path>.part`, with its validators (URL, size, ETag,
+Last-Modified) saved in `<path>.part.json`, and only renamed into place
+once complete. If the connection drops, the download continues from where
+it stopped with an HTTP Range request. This happens both within the same
+call and on the next run. The Range request carries an If-Range validator,
+so a file that changed on the server is downloaded again from the start
+rather than stitched together from two versions.
+
+Large files can also be split into parallel range segments written at
+their offsets in the same `.part` file. Segment progress is saved too, so
+an interrupted segmented download resumes segment by segment.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+
+from http_session import get_session
+
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the network and written to disk at a time
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Seconds between progress log lines
+PROGRESS_LOG_INTERVAL = 5.0
+
+# Times a dropped download is continued from where it stopped before giving up
+RESUME_ATTEMPTS = 3
+
+# Files smaller than this per segment are downloaded as a single stream
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+
+# Seconds between saves of segment progress
+STATE_SAVE_INTERVAL = 1.0
+
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".part.json"
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class IncompleteDownloadError(IOError):
+    """The server sent less of the file than it said it would"""
+
+
+class RangeRequestError(IOError):
+    """The server didn't answer a range request with the requested range"""
+
+
+def format_bytes(size: float):
+    """Format a byte count for humans (e.g. "12.3 MB")"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def create_progress_logger(label: str, interval: float = PROGRESS_LOG_INTERVAL):
+    """
+    Create a progress callback that logs at most every `interval` seconds
+
+    Args:
+        label: What is being downloaded, for the log lines
+        interval: Minimum seconds between log lines
+
+    Returns:
+        A callback for download_file's progress_callback
+    """
+    last_logged = [0.0]
+
+    def log_progress(downloaded: int, total: int, elapsed: float):
+        if elapsed - last_logged[0] < interval and downloaded != total:
+            return
+        last_logged[0] = elapsed
+        throughput = downloaded / elapsed if elapsed > 0 else 0
+        if total:
+            logger.info(
+                f"{label}: {format_bytes(downloaded)} of {format_bytes(total)} "
+                f"({downloaded / total:.0%}) at {format_bytes(throughput)}/s"
+            )
+        else:
+            logger.info(f"{label}: {format_bytes(downloaded)} at {format_bytes(throughput)}/s")
+
+    return log_progress
+
+
+def get_validators(headers):
+    """
+    Get the headers that identify a version of a file
+
+    Returns:
+        Dict with the "etag" and "last_modified" header values (None if absent)
+    """
+    return {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+
+
+def get_if_range(state: dict):
+    """Get the If-Range value for a saved download, or None if it has no usable validator"""
+    etag = state.get("etag")
+    # Weak ETags can't be used in If-Range
+    if etag and not etag.startswith("W/"):
+        return etag
+    return state.get("last_modified")
+
+
+def is_same_version(state: dict, validators: dict, total: int):
+    """Check that a saved download and a server response describe the same file"""
+    if state.get("total") != total:
+        return False
+    if state.get("etag") and validators["etag"]:
+        return state["etag"] == validators["etag"]
+    if state.get("last_modified") and validators["last_modified"]:
+        return state["last_modified"] == validators["last_modified"]
+    return False
+
+
+def load_download_state(state_path: str, url: str):
+    """Load the saved state of a partial download of url, or None if there isn't one"""
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("url") == url else None
+
+
+def save_download_state(state_path: str, state: dict):
+    """Save the state of a partial download, replacing the previous state atomically"""
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+def remove_partial_download(output_path: str):
+    """Delete a partial download and its saved state"""
+    for path in (output_path + PART_SUFFIX, output_path + STATE_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def hash_file(file_path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE, digest=None):
+    """
+    Hash a file in fixed-size chunks
+
+    Args:
+        file_path: Path to the file
+        chunk_size: Bytes read at a time
+        digest: hashlib object to update (default: a new SHA-256)
+
+    Returns:
+        The updated hashlib object
+    """
+    digest = digest or hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest
+
+
+def probe_download(session: requests.Session, url: str):
+    """
+    Ask the server for a file's size and validators, and whether it serves ranges
+
+    Returns:
+        Dict with "total" (None if unknown), "accepts_ranges", "etag" and "last_modified"
+    """
+    response = session.head(url, allow_redirects=True)
+    response.raise_for_status()
+    total = response.headers.get("Content-Length")
+    return {
+        "total": int(total) if total is not None and not response.headers.get("Content-Encoding") else None,
+        "accepts_ranges": response.headers.get("Accept-Ranges", "").lower() == "bytes",
+        **get_validators(response.headers),
+    }
+
+
+def download_file(
+    url: str,
+    output_path: str,
+    session: requests.Session = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    progress_callback=None,
+    segments: int = 1,
+    resume: bool = True,
+):
+    """
+    Stream a URL to a file in fixed-size chunks, resuming partial downloads
+
+    Args:
+        url: URL to download
+        output_path: Path to write the file to (replaced only once the download completes)
+        session: HTTP session to download with (default: the shared pooled session)
+        chunk_size: Bytes read and written at a time
+        progress_callback: Called as callback(bytes downloaded, total bytes or None,
+            seconds elapsed) after every chunk
+        segments: Parallel range requests to split the file into, if the server supports
+            ranges and the file is large enough (1 for a single stream)
+        resume: Continue a partial download left by an earlier run (False to start over)
+
+    Returns:
+        Dict with the "path", "size" in bytes, "sha256" hex digest, "seconds" taken,
+        and "resumed_from" (bytes already on disk when the download started)
+
+    Raises:
+        requests.HTTPError: If the server answers with an error status
+        IncompleteDownloadError: If the server keeps sending less than the whole file
+        RangeRequestError: If the file changes on the server during a segmented download
+    """
+    session = session or get_session()
+    if not resume:
+        remove_partial_download(output_path)
+
+    state = load_download_state(output_path + STATE_SUFFIX, url)
+    if segments > 1 or (state and state.get("segments")):
+        try:
+            probe = probe_download(session, url)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Couldn't check {url} for range support ({e}); downloading as one stream")
+            probe = None
+        if probe and probe["accepts_ranges"] and probe["total"] and probe["total"] >= MIN_SEGMENT_SIZE * 2:
+            segments = min(segments, probe["total"] // MIN_SEGMENT_SIZE)
+            return download_segments(url, output_path, session, probe, segments, chunk_size, progress_callback)
+        if state and state.get("segments"):
+            # A segmented download can't be continued as a single stream
+            remove_partial_download(output_path)
+
+    return download_stream(url, output_path, session, chunk_size, progress_callback)
+
+
+def download_stream(url, output_path, session, chunk_size=DOWNLOAD_CHUNK_SIZE, progress_callback=None):
+    """
+    Download a file as one stream, continuing from a partial download with a Range request
+
+    Arguments and return value are as for download_file.
+    """
+    part_path = output_path + PART_SUFFIX
+    state_path = output_path + STATE_SUFFIX
+    started = time.monotonic()
+    resumed_from = None
+
+    for attempt in range(RESUME_ATTEMPTS + 1):
+        state = load_download_state(state_path, url)
+        offset = os.path.getsize(part_path) if state and os.path.exists(part_path) else 0
+        if_range = get_if_range(state) if state else None
+        headers = {"Range": f"bytes={offset}-", "If-Range": if_range} if offset and if_range else {}
+        if not headers:
+            offset = 0
+
+        try:
+            with session.get(url, stream=True, headers=headers) as response:
+                content_range = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+                validators = get_validators(response.headers)
+
+                if response.status_code == 416 and offset and offset == state.get("total"):
+                    # The partial download was already complete
+                    total = offset
+                    downloaded = offset
+                    digest = hash_file(part_path, chunk_size)
+                elif response.status_code in (206, 416):
+                    if not (
+                        response.status_code == 206
+                        and content_range
+                        and int(content_range.group(1)) == offset
+                        and is_same_version(state, validators, int(content_range.group(3)))
+                    ):
+                        logger.info(f"The partial download of {url} doesn't match the server's file; restarting")
+                        remove_partial_download(output_path)
+                        continue
+                    total = int(content_range.group(3))
+                    logger.info(f"Resuming download of {url} from {format_bytes(offset)}")
+                    digest = hash_file(part_path, chunk_size)
+                    downloaded = write_response(
+                        response, part_path, "ab", offset, total, digest, chunk_size, progress_callback, started
+                    )
+                else:
+                    response.raise_for_status()
+                    if offset:
+                        logger.info(f"{url} changed or doesn't support ranges; downloading from the start")
+                    offset = 0
+                    total = None
+                    if "Content-Length" in response.headers and not response.headers.get("Content-Encoding"):
+                        total = int(response.headers["Content-Length"])
+                    save_download_state(state_path, {"url": url, "total": total, **validators})
+                    digest = hashlib.sha256()
+                    downloaded = write_response(
+                        response, part_path, "wb", 0, total, digest, chunk_size, progress_callback, started
+                    )
+            if resumed_from is None:
+                resumed_from = offset
+
+            if total is not None and downloaded != total:
+                raise IncompleteDownloadError(f"Download of {url} ended after {downloaded} of {total} bytes")
+            break
+
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                IncompleteDownloadError) as e:
+            if resumed_from is None:
+                resumed_from = offset
+            if attempt == RESUME_ATTEMPTS:
+                raise
+            logger.warning(f"Download of {url} interrupted ({e}); resuming...")
+
+    os.replace(part_path, output_path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return {
+        "path": output_path,
+        "size": downloaded,
+        "sha256": digest.hexdigest(),
+        "seconds": time.monotonic() - started,
+        "resumed_from": resumed_from,
+    }
+
+
+def write_response(response, part_path, mode, offset, total, digest, chunk_size, progress_callback, started):
+    """
+    Append or write a streamed response body to the part file, hashing it
+
+    Returns:
+        The size of the part file once the body has been written
+    """
+    downloaded = offset
+    with open(part_path, mode) as f:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            f.write(chunk)
+            digest.update(chunk)
+            downloaded += len(chunk)
+            if progress_callback:
+                progress_callback(downloaded, total, time.monotonic() - started)
+    return downloaded
+
+
+def download_segments(url, output_path, session, probe, segments, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                      progress_callback=None):
+    """
+    Download a file as parallel range segments, written at their offsets in one part file
+
+    Args:
+        probe: The file's size and validators, from probe_download
+        segments: Number of segments to split a new download into
+
+    Other arguments and the return value are as for download_file.
+    """
+    part_path = output_path + PART_SUFFIX
+    state_path = output_path + STATE_SUFFIX
+    total = probe["total"]
+    validators = {"etag": probe["etag"], "last_modified": probe["last_modified"]}
+    if_range = get_if_range(validators)
+    started = time.monotonic()
+
+    state = load_download_state(state_path, url)
+    if (
+        state
+        and state.get("segments")
+        and is_same_version(state, validators, total)
+        and os.path.exists(part_path)
+        and os.path.getsize(part_path) == total
+    ):
+        logger.info(f"Resuming segmented download of {url}")
+    else:
+        segment_size = -(-total // segments)
+        state = {
+            "url": url,
+            "total": total,
+            **validators,
+            "segments": [
+                # [first byte, last byte, bytes done]
+                [start, min(start + segment_size, total) - 1, 0]
+                for start in range(0, total, segment_size)
+            ],
+        }
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+        save_download_state(state_path, state)
+
+    resumed_from = sum(done for _, _, done in state["segments"])
+    progress = {"downloaded": resumed_from, "saved_at": time.monotonic()}
+    lock = threading.Lock()
+
+    def record_progress(segment, length):
+        with lock:
+            segment[2] += length
+            progress["downloaded"] += length
+            now = time.monotonic()
+            if now - progress["saved_at"] >= STATE_SAVE_INTERVAL:
+                save_download_state(state_path, state)
+                progress["saved_at"] = now
+            if progress_callback:
+                progress_callback(progress["downloaded"], total, now - started)
+
+    def fetch_segment(segment):
+        for attempt in range(RESUME_ATTEMPTS + 1):
+            first, last, done = segment
+            if first + done > last:
+                return
+            headers = {"Range": f"bytes={first + done}-{last}"}
+            if if_range:
+                headers["If-Range"] = if_range
+            try:
+                with session.get(url, stream=True, headers=headers) as response:
+                    content_range = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+                    if response.status_code != 206 or not content_range or int(content_range.group(1)) != first + done:
+                        response.raise_for_status()
+                        raise RangeRequestError(
+                            f"{url} didn't return the requested range (status {response.status_code}); "
+                            "it may have changed on the server"
+                        )
+                    with open(part_path, "r+b") as f:
+                        f.seek(first + done)
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            chunk = chunk[:last + 1 - f.tell()]
+                            f.write(chunk)
+                            # Written bytes must reach the file before the state claims them
+                            f.flush()
+                            record_progress(segment, len(chunk))
+                if segment[0] + segment[2] > segment[1]:
+                    return
+                raise IncompleteDownloadError(f"Segment {first}-{last} of {url} ended early")
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    IncompleteDownloadError) as e:
+                if attempt == RESUME_ATTEMPTS:
+                    raise
+                logger.warning(f"Segment {first}-{last} of {url} interrupted ({e}); resuming...")
+
+    logger.info(f"Downloading {url} in {len(state['segments'])} segments")
+    try:
+        with ThreadPoolExecutor(max_workers=len(state["segments"])) as executor:
+            for future in [executor.submit(fetch_segment, segment) for segment in state["segments"]]:
+                future.result()
+    finally:
+        with lock:
+            save_download_state(state_path, state)
+
+    # Segments arrive out of order, so the file is hashed once it is complete
+    digest = hash_file(part_path, chunk_size)
+    os.replace(part_path, output_path)
+    os.remove(state_path)
+    return {
+        "path": output_path,
+        "size": total,
+        "sha256": digest.hexdigest(),
+        "seconds": time.monotonic() - started,
+        "resumed_from": resumed_from,
+    }
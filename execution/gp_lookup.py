@@ -2,40 +2,155 @@
 GP Supplier Lookup Utility
 
 Provides command-line and programmatic access to GP supplier data.
-Allows querying by ODS code, GP name, or IT system.
+Allows querying by ODS code, GP name, IT system, or ICB Sub location.
 
 Usage:
     python execution/gp_lookup.py --ods-code A81001
     python execution/gp_lookup.py --name "DENSHAM SURGERY"
+    python execution/gp_lookup.py --name "DENSHAM SURGERY" --fuzzy
     python execution/gp_lookup.py --system TPP
     python execution/gp_lookup.py --system EMIS --output json
+    python execution/gp_lookup.py --icb 16C
+    python execution/gp_lookup.py --autocomplete DENS --limit 5
+    python execution/gp_lookup.py --ods-code A81001 --no-snapshot
+    python execution/gp_lookup.py --ods-code A81001 --mmap
+    python execution/gp_lookup.py --serve --port 8765
 """
 
 import argparse
+import bisect
+import copy
 import csv
 import glob
+import hashlib
+import io
 import json
+import mmap
 import os
+import pickle
 import sys
 
+# Add execution directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from helpers import load_csv_index, read_indexed_csv_rows
+
 
 # Default data file pattern
 DATA_DIR = "execution/data"
 DATA_FILE_PATTERN = "icb_gp_suppliers_*.csv"
 
+# Column added by the enrichment script
+ICB_COLUMN = "ICB Sub location"
+
+# Length of the character n-grams used by the name search index
+NGRAM_SIZE = 3
+
+# Minimum trigram similarity (0-1) for a fuzzy name match
+FUZZY_MIN_SIMILARITY = 0.3
+
+# Default number of suggestions returned by autocomplete
+AUTOCOMPLETE_LIMIT = 10
+
+# Default port for --serve
+SERVER_PORT = 8765
+
+# Pre-parsed snapshot written next to each data file (e.g. icb_gp_suppliers_2025-01.csv.snapshot)
+# Bump SNAPSHOT_VERSION whenever the indexes built in load_data change shape
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_VERSION = 3
+SNAPSHOT_ATTRIBUTES = (
+    "data",
+    "ods_index",
+    "name_keys",
+    "name_index",
+    "ngram_index",
+    "ngram_counts",
+    "word_keys",
+    "word_index",
+    "completion_keys",
+    "completion_rows",
+    "system_index",
+    "icb_index",
+)
+
+
+def get_ngrams(text: str, n: int = NGRAM_SIZE):
+    """
+    Get the set of character n-grams in a string
+
+    Args:
+        text: The string to split (e.g. "SURGERY")
+        n: The n-gram length
+
+    Returns:
+        Set of n-grams (e.g. {"SUR", "URG", "RGE", "GER", "ERY"})
+    """
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def matches_word(query_word: str, word: str):
+    """
+    Check whether a search word is a prefix or abbreviation of a word in a name
+
+    An abbreviation starts with the word's first letter and keeps some of its
+    other letters, in order.
+
+    >>> matches_word("MED", "MEDICAL"), matches_word("CTR", "CENTRE")
+    (True, True)
+    >>> matches_word("CTR", "COURT"), matches_word("MED", "HEALTH")
+    (False, False)
+
+    Args:
+        query_word: Upper-cased word from the search term (e.g. "CTR")
+        word: Upper-cased word from a practice name (e.g. "CENTRE")
+
+    Returns:
+        True if query_word matches word
+    """
+    if not query_word or not word.startswith(query_word[0]):
+        return False
+    letters = iter(word[1:])
+    return all(letter in letters for letter in query_word[1:])
+
 
 class GPSupplierLookup:
     """Class for looking up GP supplier information"""
     
-    def __init__(self, data_file=None):
+    def __init__(self, data_file=None, use_snapshot=True, lazy=False, reload_on_change=True):
         """
         Initialize the lookup with data from CSV file
         
         Args:
             data_file: Path to the GP suppliers CSV file
+            use_snapshot: If True, load from and refresh the pre-parsed snapshot
+                next to the CSV file instead of always re-parsing it
+            lazy: If True and the CSV file has an up-to-date sidecar index, only
+                load the index and read rows from the file as they are needed.
+                Name searches still load every row on first use.
+            reload_on_change: If True, every query first checks whether the CSV
+                file has changed and reloads it if so. Long-running servers turn
+                this off so a reload never blocks requests; restart them instead.
         """
         self.data_file = data_file
+        self.use_snapshot = use_snapshot
+        self.lazy = lazy
+        self.reload_on_change = reload_on_change
+        self.csv_index = None
         self.data = []
+        self.ods_index = {}
+        self.name_keys = []
+        self.name_index = {}
+        self.ngram_index = {}
+        self.ngram_counts = []
+        self.word_keys = []
+        self.word_index = {}
+        self.completion_keys = []
+        self.completion_rows = []
+        self.system_index = {}
+        self.icb_index = {}
+        self.data_mtime = None
+        self.statistics = None
         self.load_data()
     
     def load_data(self):
@@ -46,9 +161,170 @@ class GPSupplierLookup:
                 f"Run the update scripts to download and enrich the data first."
             )
         
-        with open(self.data_file, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            self.data = list(reader)
+        self.data_mtime = os.path.getmtime(self.data_file)
+        self.statistics = None
+
+        self.csv_index = load_csv_index(self.data_file) if self.lazy else None
+        if self.csv_index is not None:
+            return
+
+        if self.use_snapshot and self.load_snapshot():
+            return
+
+        with open(self.data_file, "rb") as f:
+            content = f.read()
+
+        reader = csv.DictReader(io.StringIO(content.decode("utf-8"), newline=None))
+        self.data = list(reader)
+
+        self.build_indexes()
+
+        if self.use_snapshot:
+            self.save_snapshot(hashlib.sha256(content).hexdigest())
+
+    def get_snapshot_file(self):
+        """Get the path of the snapshot file for the data file"""
+        return self.data_file + SNAPSHOT_SUFFIX
+
+    def load_snapshot(self):
+        """
+        Load the data and indexes from the snapshot file if it matches the data file
+
+        The snapshot is trusted if it was taken at the data file's current mtime.
+        Otherwise the data file is hashed, and the snapshot is only used (and
+        re-stamped with the new mtime) if the content is unchanged.
+
+        Returns:
+            True if the snapshot was loaded, False if the CSV must be parsed
+        """
+        try:
+            with open(self.get_snapshot_file(), "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception:
+            # Missing, unreadable or corrupt snapshot
+            return False
+
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            return False
+
+        if snapshot["mtime"] != self.data_mtime:
+            with open(self.data_file, "rb") as f:
+                sha256 = hashlib.sha256(f.read()).hexdigest()
+            if sha256 != snapshot["sha256"]:
+                return False
+
+        for attribute in SNAPSHOT_ATTRIBUTES:
+            setattr(self, attribute, snapshot["indexes"][attribute])
+
+        if snapshot["mtime"] != self.data_mtime:
+            self.save_snapshot(snapshot["sha256"])
+
+        return True
+
+    def save_snapshot(self, sha256: str):
+        """
+        Write the data and indexes to the snapshot file
+
+        Failures (e.g. a read-only data directory) are ignored, as the
+        snapshot is only a cache of the CSV file.
+
+        Args:
+            sha256: Hex SHA-256 digest of the data file contents
+        """
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "mtime": self.data_mtime,
+            "sha256": sha256,
+            "indexes": {
+                attribute: getattr(self, attribute) for attribute in SNAPSHOT_ATTRIBUTES
+            },
+        }
+
+        snapshot_file = self.get_snapshot_file()
+        tmp_file = f"{snapshot_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, snapshot_file)
+        except OSError:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def ensure_loaded(self):
+        """Load every row and build the in-memory indexes if only the sidecar index is loaded"""
+        if self.csv_index is not None:
+            self.lazy = False
+            self.load_data()
+
+    def get_indexed_rows(self, column: str, value: str):
+        """
+        Read the rows with a given column value using the sidecar index
+
+        Args:
+            column: A column grouped in the sidecar index (e.g. "GP_SYSTEM")
+            value: The column value to match
+
+        Returns:
+            List of matching rows, or None if the column is not indexed
+        """
+        groups = self.csv_index["groups"].get(column)
+        if groups is None:
+            return None
+        return read_indexed_csv_rows(self.data_file, self.csv_index, groups.get(value, []))
+
+    def reload_if_changed(self):
+        """Reload the data and indexes if the data file has changed since loading (called by every query)"""
+        if self.reload_on_change and os.path.getmtime(self.data_file) != self.data_mtime:
+            self.load_data()
+
+    def build_indexes(self):
+        """Build in-memory indexes over the loaded rows"""
+        # ODS code -> row, keeping the first row seen for each code
+        self.ods_index = {}
+        for row in self.data:
+            self.ods_index.setdefault(row["GP_ODS_CODE"].upper(), row)
+
+        # Upper-cased names, aligned with self.data by row position
+        self.name_keys = [row["GP_NAME"].upper() for row in self.data]
+
+        # Exact name -> rows, and n-gram -> row positions (ascending)
+        # plus the number of distinct n-grams in each name for fuzzy scoring
+        self.name_index = {}
+        self.ngram_index = {}
+        self.ngram_counts = []
+        for position, name in enumerate(self.name_keys):
+            self.name_index.setdefault(name, []).append(self.data[position])
+            ngrams = get_ngrams(name)
+            self.ngram_counts.append(len(ngrams))
+            for ngram in ngrams:
+                self.ngram_index.setdefault(ngram, []).append(position)
+
+        # Word -> row positions (ascending), with the distinct words sorted so
+        # fuzzy search can find the words a search word abbreviates
+        self.word_index = {}
+        for position, name in enumerate(self.name_keys):
+            for word in dict.fromkeys(name.split()):
+                self.word_index.setdefault(word, []).append(position)
+        self.word_keys = sorted(self.word_index)
+
+        # Sorted names and ODS codes for prefix completion, with the
+        # matching row kept in a parallel list
+        completions = [(name, position) for position, name in enumerate(self.name_keys)]
+        completions.extend(
+            (row["GP_ODS_CODE"].upper(), position)
+            for position, row in enumerate(self.data)
+        )
+        completions.sort()
+        self.completion_keys = [key for key, _ in completions]
+        self.completion_rows = [self.data[position] for _, position in completions]
+
+        # IT system -> rows and ICB Sub location -> rows, in file order
+        self.system_index = {}
+        self.icb_index = {}
+        for row in self.data:
+            self.system_index.setdefault(row["GP_SYSTEM"], []).append(row)
+            if row.get(ICB_COLUMN) is not None:
+                self.icb_index.setdefault(row[ICB_COLUMN], []).append(row)
     
     def lookup_by_ods_code(self, ods_code: str):
         """
@@ -60,34 +336,146 @@ class GPSupplierLookup:
         Returns:
             Dict with GP information or None if not found
         """
-        for row in self.data:
-            if row["GP_ODS_CODE"] == ods_code.upper():
-                return row
-        return None
+        self.reload_if_changed()
+        if self.csv_index is not None:
+            row_number = self.csv_index["keys"].get(ods_code.upper())
+            if row_number is None:
+                return None
+            return read_indexed_csv_rows(self.data_file, self.csv_index, [row_number])[0]
+
+        return self.ods_index.get(ods_code.upper())
     
-    def search_by_name(self, name: str, exact=False):
+    def search_by_name(self, name: str, exact=False, fuzzy=False):
         """
         Search for GP practices by name
         
         Args:
             name: GP practice name or partial name
             exact: If True, only return exact matches
+            fuzzy: If True, return similar names ranked by trigram similarity
             
         Returns:
             List of matching GP practices
         """
-        results = []
+        self.reload_if_changed()
+        self.ensure_loaded()
         search_term = name.upper()
-        
-        for row in self.data:
-            gp_name = row["GP_NAME"].upper()
-            if exact:
-                if gp_name == search_term:
-                    results.append(row)
-            else:
-                if search_term in gp_name:
-                    results.append(row)
-        
+
+        if exact:
+            return list(self.name_index.get(search_term, []))
+
+        if fuzzy and len(search_term) >= NGRAM_SIZE:
+            return self.fuzzy_search_by_name(search_term)
+
+        if len(search_term) < NGRAM_SIZE:
+            # Too short to use the n-gram index, check every name
+            return [
+                self.data[position]
+                for position, gp_name in enumerate(self.name_keys)
+                if search_term in gp_name
+            ]
+
+        # Intersect the posting lists, smallest first, then verify the
+        # surviving candidates with a real substring check
+        postings = []
+        for ngram in get_ngrams(search_term):
+            posting = self.ngram_index.get(ngram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+
+        return [
+            self.data[position]
+            for position in sorted(candidates)
+            if search_term in self.name_keys[position]
+        ]
+    
+    def fuzzy_search_by_name(self, search_term: str):
+        """
+        Rank GP practices by similarity to an upper-cased name
+
+        Practices are scored by the Jaccard similarity of their trigram set and
+        the search term's. Practices in which every word of the search term is
+        matched by a word of the name, as a prefix or abbreviation (e.g. "MED CTR"
+        for "MEDICAL CENTRE"), score 1. Only practices found in the trigram or
+        word indexes are scored.
+
+        Args:
+            search_term: Upper-cased GP practice name (e.g. "DENSHAM SURGERY")
+
+        Returns:
+            List of GP practices scoring at least FUZZY_MIN_SIMILARITY,
+            most similar first (ties broken by trigram similarity)
+        """
+        query_ngrams = get_ngrams(search_term)
+
+        # Count the trigrams each candidate shares with the search term
+        shared_counts = {}
+        for ngram in query_ngrams:
+            for position in self.ngram_index.get(ngram, ()):
+                shared_counts[position] = shared_counts.get(position, 0) + 1
+
+        # Intersect the positions of the names matching each search word
+        word_matches = None
+        for query_word in dict.fromkeys(search_term.split()):
+            positions = set()
+            start = bisect.bisect_left(self.word_keys, query_word[0])
+            end = bisect.bisect_left(self.word_keys, chr(ord(query_word[0]) + 1))
+            for word in self.word_keys[start:end]:
+                if matches_word(query_word, word):
+                    positions.update(self.word_index[word])
+            word_matches = positions if word_matches is None else word_matches & positions
+            if not word_matches:
+                break
+
+        scored = []
+        for position in shared_counts.keys() | (word_matches or set()):
+            shared = shared_counts.get(position, 0)
+            union = len(query_ngrams) + self.ngram_counts[position] - shared
+            similarity = shared / union
+            score = 1.0 if word_matches and position in word_matches else similarity
+            if score >= FUZZY_MIN_SIMILARITY:
+                scored.append((-score, -similarity, position))
+        scored.sort()
+
+        return [self.data[position] for _, _, position in scored]
+    
+    def autocomplete(self, prefix: str, limit: int = AUTOCOMPLETE_LIMIT):
+        """
+        Suggest GP practices whose name or ODS code starts with a prefix
+
+        Args:
+            prefix: Start of a GP practice name or ODS code (e.g. "DENS", "A81")
+            limit: Maximum number of practices to return
+
+        Returns:
+            List of up to `limit` matching GP practices, ordered by the matched key
+        """
+        self.reload_if_changed()
+        self.ensure_loaded()
+        search_term = prefix.upper()
+        results = []
+        seen = set()
+
+        position = bisect.bisect_left(self.completion_keys, search_term)
+        while (
+            len(results) < limit
+            and position < len(self.completion_keys)
+            and self.completion_keys[position].startswith(search_term)
+        ):
+            row = self.completion_rows[position]
+            if id(row) not in seen:
+                seen.add(id(row))
+                results.append(row)
+            position += 1
+
         return results
     
     def filter_by_system(self, system: str):
@@ -100,28 +488,60 @@ class GPSupplierLookup:
         Returns:
             List of GP practices using the specified system
         """
-        results = []
-        search_term = system.upper()
-        
-        for row in self.data:
-            if row["GP_SYSTEM"] == search_term:
-                results.append(row)
+        self.reload_if_changed()
+        if self.csv_index is not None:
+            results = self.get_indexed_rows("GP_SYSTEM", system.upper())
+            if results is not None:
+                return results
+            self.ensure_loaded()
+
+        return list(self.system_index.get(system.upper(), []))
+    
+    def filter_by_icb(self, icb_code: str):
+        """
+        Get all GP practices commissioned by a specific ICB Sub location
         
-        return results
+        Args:
+            icb_code: ICB Sub location code (e.g. "16C")
+            
+        Returns:
+            List of GP practices in the specified ICB Sub location
+        """
+        self.reload_if_changed()
+        if self.csv_index is not None:
+            results = self.get_indexed_rows(ICB_COLUMN, icb_code.upper())
+            if results is not None:
+                return results
+            self.ensure_loaded()
+
+        return list(self.icb_index.get(icb_code.upper(), []))
     
     def get_statistics(self):
         """
         Get statistics about GP IT systems
         
+        The result is cached until the data file changes, and a copy is returned
+        so callers can't change the cached result.
+        
         Returns:
             Dict with system counts and percentages
         """
-        system_counts = {}
-        total = len(self.data)
-        
-        for row in self.data:
-            system = row["GP_SYSTEM"]
-            system_counts[system] = system_counts.get(system, 0) + 1
+        self.reload_if_changed()
+        if self.statistics is not None:
+            return copy.deepcopy(self.statistics)
+
+        if self.csv_index is not None and "GP_SYSTEM" in self.csv_index["groups"]:
+            total = len(self.csv_index["rows"])
+            system_counts = {
+                system: len(row_numbers)
+                for system, row_numbers in self.csv_index["groups"]["GP_SYSTEM"].items()
+            }
+        else:
+            self.ensure_loaded()
+            total = len(self.data)
+            system_counts = {
+                system: len(rows) for system, rows in self.system_index.items()
+            }
         
         # Calculate percentages
         stats = {
@@ -135,7 +555,78 @@ class GPSupplierLookup:
                 "percentage": round((count / total) * 100, 2)
             }
         
-        return stats
+        self.statistics = stats
+        return copy.deepcopy(stats)
+
+
+def lookup_ods_code_in_file(data_file: str, ods_code: str):
+    """
+    Look up a GP practice by binary-searching the data file on disk
+
+    The data file is memory-mapped and searched line by line, relying on the
+    pipeline writing rows sorted by ODS code, so only the header and around
+    log2(rows) lines are ever parsed. Intended for one-off lookups where
+    loading GPSupplierLookup would dominate the run time.
+
+    Args:
+        data_file: Path to a GP suppliers CSV file sorted by GP_ODS_CODE
+        ods_code: GP ODS code (e.g. "A81001")
+
+    Returns:
+        Dict with GP information or None if not found
+    """
+    if not data_file or not os.path.exists(data_file):
+        raise FileNotFoundError(
+            f"GP supplier data file not found: {data_file}\n"
+            f"Run the update scripts to download and enrich the data first."
+        )
+
+    search_term = ods_code.upper()
+
+    with open(data_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_end = mm.find(b"\n")
+            if header_end == -1:
+                return None
+            fieldnames = parse_csv_line(mm[:header_end])
+            key_column = fieldnames.index("GP_ODS_CODE")
+
+            # lo is always the start of a line, hi the end of the search range
+            lo, hi = header_end + 1, len(mm)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                line_start = mm.rfind(b"\n", lo, mid) + 1 or lo
+                line_end = mm.find(b"\n", line_start)
+                if line_end == -1:
+                    line_end = len(mm)
+
+                row = parse_csv_line(mm[line_start:line_end])
+                key = row[key_column] if len(row) > key_column else ""
+
+                if key == search_term:
+                    return dict(zip(fieldnames, row))
+                if key < search_term:
+                    lo = line_end + 1
+                else:
+                    hi = line_start
+
+    return None
+
+
+def parse_csv_line(line: bytes):
+    """
+    Parse a single raw CSV line into its fields
+
+    Args:
+        line: The line's bytes, without the trailing newline
+
+    Returns:
+        List of field values (empty for a blank line)
+    """
+    return next(csv.reader([line.decode("utf-8").rstrip("\r")]), [])
 
 
 def format_output(data, output_format="text"):
@@ -191,6 +682,32 @@ def format_output(data, output_format="text"):
     return str(data)
 
 
+def get_data_file(month: str = None):
+    """
+    Get the path of the data file to query
+
+    Args:
+        month: ISO month string (e.g. "2025-01"), or None for the latest month
+
+    Returns:
+        Path to the data file, or None if no month was given and no data files exist
+    """
+    if month:
+        return os.path.join(DATA_DIR, f"icb_gp_suppliers_{month}.csv")
+
+    # Find the latest file
+    files = glob.glob(os.path.join(DATA_DIR, DATA_FILE_PATTERN))
+    if files:
+        return max(files)  # Lexicographical sort works for YYYY-MM
+
+    # Fallback to the non-suffixed one if it exists (legacy)
+    legacy_file = os.path.join(DATA_DIR, "icb_gp_suppliers.csv")
+    if os.path.exists(legacy_file):
+        return legacy_file
+
+    return None
+
+
 def main():
     """Main CLI interface"""
     parser = argparse.ArgumentParser(
@@ -209,12 +726,37 @@ def main():
         help="Search by GP practice name (partial match)"
     )
     
+    parser.add_argument(
+        "--fuzzy",
+        action="store_true",
+        help="With --name, rank similar names instead of requiring a partial match"
+    )
+    
     parser.add_argument(
         "--system",
         type=str,
         help="Filter by IT system (e.g. TPP, EMIS)"
     )
     
+    parser.add_argument(
+        "--icb",
+        type=str,
+        help="Filter by ICB Sub location code (e.g. 16C)"
+    )
+    
+    parser.add_argument(
+        "--autocomplete",
+        type=str,
+        help="Suggest practices whose name or ODS code starts with a prefix"
+    )
+    
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=AUTOCOMPLETE_LIMIT,
+        help=f"Maximum number of autocomplete suggestions (default: {AUTOCOMPLETE_LIMIT})"
+    )
+    
     parser.add_argument(
         "--stats",
         action="store_true",
@@ -229,6 +771,31 @@ def main():
         help="Output format (default: text)"
     )
     
+    parser.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="Always parse the CSV file instead of using its pre-parsed snapshot"
+    )
+    
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="With --ods-code, binary-search the sorted data file instead of loading it"
+    )
+    
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Load the data once and serve lookups over HTTP/JSON on localhost"
+    )
+    
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=SERVER_PORT,
+        help=f"Port for --serve (default: {SERVER_PORT})"
+    )
+    
     parser.add_argument(
         "--month",
         type=str,
@@ -238,38 +805,55 @@ def main():
     args = parser.parse_args()
 
     # Determine which data file to use
-    if args.month:
-        data_file = os.path.join(DATA_DIR, f"icb_gp_suppliers_{args.month}.csv")
-    else:
-        # Find the latest file
-        files = glob.glob(os.path.join(DATA_DIR, "icb_gp_suppliers_*.csv"))
-        if not files:
-            # Fallback to the non-suffixed one if it exists (legacy)
-            legacy_file = os.path.join(DATA_DIR, "icb_gp_suppliers.csv")
-            if os.path.exists(legacy_file):
-                data_file = legacy_file
-            else:
-                print(f"Error: No GP supplier data files found in {DATA_DIR}", file=sys.stderr)
-                sys.exit(1)
-        else:
-            data_file = max(files)  # Lexicographical sort works for YYYY-MM
+    data_file = get_data_file(args.month)
+    if data_file is None:
+        print(f"Error: No GP supplier data files found in {DATA_DIR}", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.serve:
+        # Only the server needs asyncio, so keep it out of one-off lookups' startup
+        from gp_lookup_server import serve
+
+        try:
+            lookup = GPSupplierLookup(
+                data_file=data_file, use_snapshot=not args.no_snapshot, reload_on_change=False
+            )
+        except FileNotFoundError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        serve(lookup, args.port)
+        return
     
     # Check if at least one search parameter is provided
-    if not any([args.ods_code, args.name, args.system, args.stats]):
+    if not any([args.ods_code, args.name, args.system, args.icb, args.autocomplete, args.stats]):
         parser.print_help()
         sys.exit(1)
     
     try:
-        lookup = GPSupplierLookup(data_file=data_file)
+        if args.ods_code and args.mmap and not args.stats:
+            # Single lookup straight from the file, without loading every row
+            print(format_output(lookup_ods_code_in_file(data_file, args.ods_code), args.output))
+            return
+        
+        # Queries answered by the sidecar index don't need every row loaded
+        lookup = GPSupplierLookup(
+            data_file=data_file,
+            use_snapshot=not args.no_snapshot,
+            lazy=not (args.name or args.autocomplete),
+        )
         
         if args.stats:
             result = lookup.get_statistics()
         elif args.ods_code:
             result = lookup.lookup_by_ods_code(args.ods_code)
         elif args.name:
-            result = lookup.search_by_name(args.name)
+            result = lookup.search_by_name(args.name, fuzzy=args.fuzzy)
         elif args.system:
             result = lookup.filter_by_system(args.system)
+        elif args.icb:
+            result = lookup.filter_by_icb(args.icb)
+        elif args.autocomplete:
+            result = lookup.autocomplete(args.autocomplete, args.limit)
         else:
             result = None
         
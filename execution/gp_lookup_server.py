@@ -0,0 +1,313 @@
+"""
+GP Supplier Lookup Server
+
+Serves GP supplier lookups over local HTTP/JSON from a single, warm
+GPSupplierLookup, so callers don't pay interpreter start-up, imports and
+CSV parsing on every query. Started with `gp_lookup.py --serve`.
+
+The server runs on a single asyncio event loop: every connection is a
+coroutine rather than a thread, and HTTP/1.1 keep-alive connections stay
+open between requests, so thousands of concurrent clients can be held
+open at once. Lookups themselves are in-memory and answered inline.
+
+Endpoints (all GET, all responses JSON):
+    /ods/<code>                      Practice for an ODS code (404 if unknown)
+    /search?name=<name>[&fuzzy=1]    Practices matching a name
+    /autocomplete?prefix=<prefix>[&limit=<n>]
+    /system/<name>                   Practices using an IT system
+    /icb/<code>                      Practices in an ICB Sub location
+    /stats                           IT system statistics
+    /metrics                         Server request, connection and latency counters
+
+Usage:
+    python execution/gp_lookup.py --serve
+    python execution/gp_lookup.py --serve --port 8080 --month 2025-01
+"""
+
+import asyncio
+from collections import deque
+from http import HTTPStatus
+import json
+import math
+import sys
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+# The server only ever listens on the loopback interface
+SERVER_HOST = "127.0.0.1"
+
+# Pending connections the OS may queue while the event loop is busy accepting
+SERVER_BACKLOG = 4096
+
+# Seconds an idle keep-alive connection is kept open
+KEEPALIVE_TIMEOUT = 60
+
+# Maximum size of a request line plus headers
+MAX_HEADER_BYTES = 16 * 1024
+
+# Largest request body discarded to keep a connection open; lookups never take one
+MAX_BODY_BYTES = 64 * 1024
+
+# Number of recent request latencies kept for the /metrics percentiles
+LATENCY_SAMPLES = 100000
+
+
+def route_request(lookup, target: str):
+    """
+    Answer a lookup request
+
+    Args:
+        lookup: A loaded GPSupplierLookup
+        target: The request path and query string (e.g. "/search?name=DENSHAM")
+
+    Returns:
+        Tuple of (HTTP status code, JSON-serialisable response body)
+    """
+    url = urlsplit(target)
+    parts = [unquote(part) for part in url.path.split("/") if part]
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+    if len(parts) == 2 and parts[0] == "ods":
+        result = lookup.lookup_by_ods_code(parts[1])
+        if result is None:
+            return 404, {"error": f"ODS code not found: {parts[1]}"}
+        return 200, result
+
+    if len(parts) == 2 and parts[0] == "system":
+        return 200, lookup.filter_by_system(parts[1])
+
+    if len(parts) == 2 and parts[0] == "icb":
+        return 200, lookup.filter_by_icb(parts[1])
+
+    if parts == ["search"]:
+        if not query.get("name"):
+            return 400, {"error": "Missing required query parameter: name"}
+        fuzzy = query.get("fuzzy", "").lower() in ("1", "true", "yes")
+        return 200, lookup.search_by_name(query["name"], fuzzy=fuzzy)
+
+    if parts == ["autocomplete"]:
+        if not query.get("prefix"):
+            return 400, {"error": "Missing required query parameter: prefix"}
+        if "limit" not in query:
+            return 200, lookup.autocomplete(query["prefix"])
+        try:
+            limit = int(query["limit"])
+        except ValueError:
+            return 400, {"error": f"Invalid limit: {query['limit']}"}
+        return 200, lookup.autocomplete(query["prefix"], limit)
+
+    if parts == ["stats"]:
+        return 200, lookup.get_statistics()
+
+    return 404, {"error": f"Unknown endpoint: {url.path}"}
+
+
+def get_percentile(sorted_values: list, percentile: float):
+    """
+    Get a percentile of a sorted list using the nearest-rank method
+
+    Args:
+        sorted_values: Values in ascending order
+        percentile: The percentile to get (e.g. 99)
+
+    Returns:
+        The percentile value, or None if there are no values
+    """
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(percentile / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class ServerMetrics:
+    """Request, connection and latency counters for the lookup server"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.open_connections = 0
+        self.total_connections = 0
+        self.requests = 0
+        self.responses = {}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record_response(self, status: int, latency: float):
+        """
+        Record a completed request
+
+        Args:
+            status: The HTTP status code sent
+            latency: Seconds from the request being read to the response being sent
+        """
+        self.requests += 1
+        self.responses[status] = self.responses.get(status, 0) + 1
+        self.latencies.append(latency)
+
+    def to_dict(self):
+        """
+        Get the counters as a JSON-serialisable dict
+
+        Returns:
+            Dict of counters, with latency percentiles in milliseconds
+            over the most recent LATENCY_SAMPLES requests
+        """
+        uptime = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+
+        def to_ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 3)
+
+        return {
+            "uptime_seconds": round(uptime, 1),
+            "open_connections": self.open_connections,
+            "total_connections": self.total_connections,
+            "requests": self.requests,
+            "requests_per_second": round(self.requests / uptime, 1) if uptime else 0,
+            "responses": {str(status): count for status, count in sorted(self.responses.items())},
+            "latency_ms": {
+                "samples": len(latencies),
+                "p50": to_ms(get_percentile(latencies, 50)),
+                "p90": to_ms(get_percentile(latencies, 90)),
+                "p99": to_ms(get_percentile(latencies, 99)),
+                "max": to_ms(latencies[-1] if latencies else None),
+            },
+        }
+
+
+class LookupServer:
+    """Asyncio HTTP/1.1 server answering lookups from a GPSupplierLookup"""
+
+    def __init__(self, lookup, port: int):
+        """
+        Initialize the server
+
+        Args:
+            lookup: A loaded GPSupplierLookup
+            port: The port to listen on
+        """
+        self.lookup = lookup
+        self.port = port
+        self.metrics = ServerMetrics()
+
+    async def serve_forever(self):
+        """Listen on localhost and serve connections until cancelled"""
+        server = await asyncio.start_server(
+            self.handle_connection,
+            SERVER_HOST,
+            self.port,
+            backlog=SERVER_BACKLOG,
+            limit=MAX_HEADER_BYTES,
+        )
+        print(f"Serving GP supplier lookups on http://{SERVER_HOST}:{self.port}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serve requests on a connection until the client closes it or it goes idle
+
+        Args:
+            reader: The connection's asyncio StreamReader
+            writer: The connection's asyncio StreamWriter
+        """
+        self.metrics.open_connections += 1
+        self.metrics.total_connections += 1
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT
+                    )
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+
+                started = time.perf_counter()
+                status, body, keep_alive = await self.handle_request(head, reader)
+
+                content = json.dumps(body).encode("utf-8")
+                headers = (
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    f"\r\n"
+                )
+                writer.write(headers.encode("latin-1") + content)
+                await writer.drain()
+
+                self.metrics.record_response(status, time.perf_counter() - started)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.metrics.open_connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def handle_request(self, head: bytes, reader):
+        """
+        Parse a request head and answer it
+
+        Args:
+            head: The request line and headers, up to and including the blank line
+            reader: The connection's StreamReader, for discarding any request body
+
+        Returns:
+            Tuple of (HTTP status code, response body, whether to keep the connection open)
+        """
+        lines = head.decode("latin-1").split("\r\n")
+        request_line = lines[0].split()
+        if len(request_line) != 3:
+            return 400, {"error": "Malformed request line"}, False
+        method, target, version = request_line
+
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+
+        # Lookups never take a body, but one must be consumed to keep the connection usable
+        try:
+            content_length = int(headers.get("content-length", 0))
+        except ValueError:
+            return 400, {"error": "Invalid Content-Length"}, False
+        if content_length < 0 or content_length > MAX_BODY_BYTES:
+            return 400, {"error": "Invalid Content-Length"}, False
+        if content_length:
+            await reader.readexactly(content_length)
+
+        if method != "GET":
+            return 405, {"error": f"Method not allowed: {method}"}, keep_alive
+
+        if urlsplit(target).path.rstrip("/") == "/metrics":
+            return 200, self.metrics.to_dict(), keep_alive
+
+        try:
+            status, body = route_request(self.lookup, target)
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+        return status, body, keep_alive
+
+
+def serve(lookup, port: int):
+    """
+    Serve lookups over HTTP on localhost until interrupted
+
+    Args:
+        lookup: A loaded GPSupplierLookup
+        port: The port to listen on
+    """
+    try:
+        asyncio.run(LookupServer(lookup, port).serve_forever())
+    except KeyboardInterrupt:
+        pass
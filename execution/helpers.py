@@ -3,13 +3,23 @@ Helper functions for GP supplier data processing
 
 This module provides utility functions for:
 - Date/month conversion and parsing
-- File path discovery in extracted NHS data
+- File path discovery in extracted NHS data (or inside the zip itself)
 - GP IT system identification from appointment data
+- Writing and reading CSV files with a sidecar row offset index
 """
 
+import csv
+import io
+import json
 import os
 
 
+# Sidecar index written next to each output CSV (e.g. gp_suppliers_2025-01.csv.index.json)
+# Bump CSV_INDEX_VERSION whenever the index layout changes
+CSV_INDEX_SUFFIX = ".index.json"
+CSV_INDEX_VERSION = 1
+
+
 def month_to_name(month: str):
     """
     Translate a zero-padded month string to a name
@@ -66,15 +76,33 @@ def get_data_file_paths(unzip_dir: str, iso_month: str):
         (e.g. [".tmp/2025-01/Practice_Level_Crosstab_Midlands_Feb_25.csv", 
                ".tmp/2025-01/Practice_Level_Crosstab_North_East_Feb_25.csv"])
     """
+    return [
+        os.path.join(unzip_dir, f)
+        for f in get_data_file_names(os.listdir(unzip_dir), iso_month)
+    ]
+
+
+def get_data_file_names(file_names: list[str], iso_month: str):
+    """
+    Pick out the Practice Level Crosstab files for an ISO month from a list of file names
+
+    Args:
+        file_names: File names, or member names of a zip file (which may include folders)
+        iso_month: The ISO month string (e.g. "2025-01")
+
+    Returns:
+        The matching names, unchanged and in their original order
+        (e.g. ["Practice_Level_Crosstab_Midlands_Jan_25.csv"])
+    """
     month, year = get_month_and_year_from_iso_month(iso_month)
     abbreviated_month = month[:3].capitalize()  # e.g. january becomes Jan
     abbreviated_year = year[2:4]  # e.g. 2025 becomes 25
     search_string = f"{abbreviated_month}_{abbreviated_year}.csv"
 
     return [
-        os.path.join(unzip_dir, f)
-        for f in os.listdir(unzip_dir)
-        if f.endswith(search_string)
+        f
+        for f in file_names
+        if f.rsplit("/", 1)[-1].endswith(search_string)
     ]
 
 
@@ -101,3 +129,127 @@ def get_main_system_from_value(value):
     else:
         # Default to first system if no EVERGREENLIFE
         return systems[0]
+
+
+def write_indexed_csv(
+    output_file: str,
+    fieldnames: list[str],
+    rows,
+    key_column: str,
+    group_columns: list[str] = (),
+):
+    """
+    Write a CSV file and its sidecar row offset index in a single pass
+
+    The index records the byte span of every row, maps each key (e.g. ODS code)
+    to its first row, and groups rows by the values of the group columns
+    (e.g. GP_SYSTEM), so readers can seek straight to the rows they need.
+
+    Args:
+        output_file: Path to the output CSV file
+        fieldnames: The header row
+        rows: Iterable of rows, each a list of values in fieldnames order
+        key_column: The column to index rows by (e.g. "GP_ODS_CODE")
+        group_columns: Columns to group rows by (e.g. ["GP_SYSTEM"]), ignored if absent
+
+    Returns:
+        The number of rows written
+    """
+    key_position = fieldnames.index(key_column)
+    group_positions = {
+        column: fieldnames.index(column) for column in group_columns if column in fieldnames
+    }
+
+    spans = []
+    keys = {}
+    groups = {column: {} for column in group_positions}
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def encode_row(row):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        return buffer.getvalue().encode("utf-8")
+
+    with open(output_file, "wb") as file:
+        offset = file.write(encode_row(fieldnames))
+        for row in rows:
+            line = encode_row(row)
+            row_number = len(spans)
+            spans.append([offset, len(line)])
+            keys.setdefault(str(row[key_position]).upper(), row_number)
+            for column, position in group_positions.items():
+                groups[column].setdefault(row[position], []).append(row_number)
+            offset += file.write(line)
+
+    index = {
+        "version": CSV_INDEX_VERSION,
+        "size": offset,
+        "mtime": os.path.getmtime(output_file),
+        "fieldnames": fieldnames,
+        "key_column": key_column,
+        "rows": spans,
+        "keys": keys,
+        "groups": groups,
+    }
+    with open(output_file + CSV_INDEX_SUFFIX, "w", encoding="utf-8") as file:
+        json.dump(index, file, separators=(",", ":"))
+
+    return len(spans)
+
+
+def load_csv_index(csv_file: str):
+    """
+    Load the sidecar row offset index for a CSV file
+
+    Args:
+        csv_file: Path to the CSV file
+
+    Returns:
+        The index dict, or None if it is missing, unreadable or out of date
+    """
+    try:
+        with open(csv_file + CSV_INDEX_SUFFIX, "r", encoding="utf-8") as file:
+            index = json.load(file)
+        stat = os.stat(csv_file)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        not isinstance(index, dict)
+        or index.get("version") != CSV_INDEX_VERSION
+        or index.get("size") != stat.st_size
+        or index.get("mtime") != stat.st_mtime
+    ):
+        return None
+
+    return index
+
+
+def read_indexed_csv_rows(csv_file: str, index: dict, row_numbers):
+    """
+    Read specific rows of a CSV file by seeking to their indexed byte spans
+
+    Args:
+        csv_file: Path to the CSV file
+        index: The file's index, from load_csv_index
+        row_numbers: Iterable of row numbers in the index
+
+    Returns:
+        List of rows as dicts keyed by the header fieldnames
+    """
+    fieldnames = index["fieldnames"]
+    spans = index["rows"]
+    results = []
+
+    with open(csv_file, "rb") as file:
+        for row_number in row_numbers:
+            offset, length = spans[row_number]
+            file.seek(offset)
+            text = file.read(length).decode("utf-8")
+            row = next(csv.reader(io.StringIO(text, newline=None)), [])
+            results.append(dict(zip(fieldnames, row)))
+
+    return results
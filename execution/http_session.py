@@ -0,0 +1,88 @@
+"""
+Shared HTTP sessions for NHS network I/O
+
+Every request made through a session reuses pooled keep-alive connections,
+instead of opening a new TCP and TLS connection per call the way the
+module-level `requests.get` does. Sessions also apply a default timeout and
+retry connection errors and 5xx responses with exponential backoff.
+HTTP 429 is deliberately never retried here, even with a Retry-After
+header: every 429 is returned to the caller so its rate limiter sees the
+throttle and slows down (see rate_control.py).
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Connections kept open per host; should be at least the number of threads sharing the session
+DEFAULT_POOL_SIZE = 10
+
+# Retries of connection errors and 5xx responses, with exponential backoff between them
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Seconds to wait for a connection, and between bytes of a response
+DEFAULT_TIMEOUT = (10, 60)
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+class TimeoutSession(requests.Session):
+    """Session that applies a default timeout to every request"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT):
+    """
+    Create an HTTP session with a connection pool, retries and a default timeout
+
+    Args:
+        pool_size: Maximum connections kept open per host
+        retries: Retries of connection errors and 5xx responses (0 to disable)
+        timeout: Default timeout in seconds, or a (connect, read) tuple
+
+    Returns:
+        A requests.Session
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["GET", "HEAD"],
+        raise_on_status=False,
+        # Otherwise urllib3 silently retries any 429 carrying Retry-After, bypassing
+        # the callers' rate limiter (503s are still retried, with backoff)
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = TimeoutSession(timeout)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """
+    Get the process-wide session with default settings, creating it on first use
+
+    Returns:
+        A requests.Session shared by every caller in the process
+    """
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = create_session()
+        return _shared_session
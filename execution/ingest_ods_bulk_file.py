@@ -0,0 +1,232 @@
+"""
+ODS Bulk File Ingestion
+
+Loads GP practice -> commissioner codes from an NHS ODS bulk organisation
+extract (e.g. epraccur.csv, or the epraccur.zip it is published in) into the
+GP to ICB Sub location map, so enrichment only has to call the ODS API for
+the few practices the extract doesn't cover.
+
+The file is streamed and written to the map store in batches, then the map
+CSV is re-exported. epraccur files have no header row; the practice code
+is column 1 and the commissioner (Sub ICB Location) code is column 15.
+Other extracts can be read by choosing the columns.
+
+By default only practices missing from the map are added, so hand edits
+and earlier API results are kept. Pass --update-existing to let the
+extract overwrite mappings that differ.
+
+Usage:
+    python execution/ingest_ods_bulk_file.py --file .tmp/epraccur.zip
+    python execution/ingest_ods_bulk_file.py --file .tmp/epraccur.csv --active-only --update-existing
+"""
+
+import argparse
+import csv
+import io
+import logging
+import os
+import re
+import sys
+import zipfile
+
+# Add execution directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from map_store import MAP_DB_FILE, CommissionerMapStore
+
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+logger = logging.getLogger(__name__)
+
+MAP_FILE = "execution/data/GP to ICB Sub location - Map.csv"
+
+# epraccur column positions (1-based, as in the NHS ODS file specification)
+ORGANISATION_CODE_COLUMN = 1
+STATUS_CODE_COLUMN = 13
+COMMISSIONER_COLUMN = 15
+
+# Status code of an active organisation
+ACTIVE_STATUS = "A"
+
+# Mappings written per map store transaction
+INGEST_BATCH_SIZE = 5000
+
+# Anything else in the code column (e.g. a header row) is skipped
+ODS_CODE_PATTERN = re.compile(r"^[A-Z0-9]{3,10}$")
+
+
+def open_bulk_file(file_path: str):
+    """
+    Open an ODS bulk extract for reading as text
+
+    Args:
+        file_path: Path to a CSV file, or a zip file containing one
+
+    Returns:
+        A text file object, streamed straight from the zip if given one
+    """
+    if not zipfile.is_zipfile(file_path):
+        return open(file_path, "r", newline="", encoding="utf-8-sig", errors="replace")
+
+    zip_file = zipfile.ZipFile(file_path)
+    csv_names = [name for name in zip_file.namelist() if name.lower().endswith(".csv")]
+    if not csv_names:
+        zip_file.close()
+        raise ValueError(f"No CSV file found in {file_path}")
+    if len(csv_names) > 1:
+        logger.warning(f"{file_path} contains {len(csv_names)} CSV files; reading {csv_names[0]}")
+    # The member stays readable after the ZipFile object is garbage collected
+    return io.TextIOWrapper(zip_file.open(csv_names[0]), encoding="utf-8-sig", errors="replace", newline="")
+
+
+def read_commissioner_mappings(
+    file_path: str,
+    code_column: int = ORGANISATION_CODE_COLUMN,
+    commissioner_column: int = COMMISSIONER_COLUMN,
+    status_column: int = STATUS_CODE_COLUMN,
+    active_only: bool = False,
+):
+    """
+    Stream (ODS code, commissioner code) pairs from an ODS bulk extract
+
+    Rows without a valid ODS code (e.g. a header) or without a commissioner are skipped.
+
+    Args:
+        file_path: Path to the extract (CSV, or a zip containing one)
+        code_column: 1-based column of the practice ODS code
+        commissioner_column: 1-based column of the commissioner code
+        status_column: 1-based column of the status code, used with active_only
+        active_only: Skip organisations whose status isn't active
+
+    Yields:
+        (ODS code, commissioner code) tuples, in file order
+    """
+    code_index = code_column - 1
+    commissioner_index = commissioner_column - 1
+    status_index = status_column - 1
+    min_length = max(code_index, commissioner_index, status_index if active_only else 0) + 1
+
+    with open_bulk_file(file_path) as f:
+        for row in csv.reader(f):
+            if len(row) < min_length:
+                continue
+            ods_code = row[code_index].strip().upper()
+            commissioner_code = row[commissioner_index].strip().upper()
+            if not commissioner_code or not ODS_CODE_PATTERN.match(ods_code):
+                continue
+            if active_only and row[status_index].strip().upper() != ACTIVE_STATUS:
+                continue
+            yield ods_code, commissioner_code
+
+
+def ingest_bulk_file(
+    map_store: CommissionerMapStore,
+    file_path: str,
+    update_existing: bool = False,
+    **column_options,
+):
+    """
+    Load an ODS bulk extract into the map store, in batched transactions
+
+    Args:
+        map_store: The map store to update
+        file_path: Path to the extract (CSV, or a zip containing one)
+        update_existing: Overwrite mappings that differ from the extract
+        **column_options: Column and filter options for read_commissioner_mappings
+
+    Returns:
+        Dict of counts: "read", "added", "updated", "unchanged", and "kept"
+        (mappings that differ from the extract but weren't overwritten)
+    """
+    counts = {"read": 0, "added": 0, "updated": 0, "unchanged": 0, "kept": 0}
+
+    def write_batch(batch):
+        existing = map_store.get_many(ods_code for ods_code, _ in batch)
+        changes = []
+        for ods_code, commissioner_code in batch:
+            current = existing.get(ods_code)
+            if current is None:
+                counts["added"] += 1
+                changes.append((ods_code, commissioner_code))
+            elif current == commissioner_code:
+                counts["unchanged"] += 1
+            elif update_existing:
+                counts["updated"] += 1
+                changes.append((ods_code, commissioner_code))
+            else:
+                counts["kept"] += 1
+        map_store.upsert_many(changes)
+
+    batch = {}
+    for ods_code, commissioner_code in read_commissioner_mappings(file_path, **column_options):
+        counts["read"] += 1
+        # The last row for a code wins, as it would in the map CSV
+        batch[ods_code] = commissioner_code
+        if len(batch) >= INGEST_BATCH_SIZE:
+            write_batch(list(batch.items()))
+            batch = {}
+    write_batch(list(batch.items()))
+
+    return counts
+
+
+def main():
+    """Main CLI interface"""
+    parser = argparse.ArgumentParser(
+        description="Load GP practice commissioner codes from an NHS ODS bulk extract (e.g. epraccur) into the ICB map"
+    )
+
+    parser.add_argument("--file", type=str, required=True, help="Path to the extract: a CSV file, or a zip containing one")
+    parser.add_argument("--map-file", type=str, default=MAP_FILE, help="GP to ICB Sub location map CSV to update")
+    parser.add_argument("--map-db", type=str, default=MAP_DB_FILE, help="SQLite map store kept in sync with the map CSV")
+    parser.add_argument("--code-column", type=int, default=ORGANISATION_CODE_COLUMN,
+                        help=f"1-based column of the practice ODS code (default: {ORGANISATION_CODE_COLUMN})")
+    parser.add_argument("--commissioner-column", type=int, default=COMMISSIONER_COLUMN,
+                        help=f"1-based column of the commissioner code (default: {COMMISSIONER_COLUMN})")
+    parser.add_argument("--status-column", type=int, default=STATUS_CODE_COLUMN,
+                        help=f"1-based column of the status code, for --active-only (default: {STATUS_CODE_COLUMN})")
+    parser.add_argument("--active-only", action="store_true", help="Only load organisations with an active status")
+    parser.add_argument("--update-existing", action="store_true",
+                        help="Overwrite mappings that differ from the extract (default: only add missing codes)")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        logger.error(f"{args.file} not found.")
+        sys.exit(1)
+
+    map_store = CommissionerMapStore(args.map_db)
+    imported = map_store.sync_from_csv(args.map_file)
+    if imported:
+        logger.info(f"Merged {imported} mappings from {args.map_file} into the map store.")
+    logger.info(f"Map store has {map_store.count()} mappings. Reading {args.file}...")
+
+    counts = ingest_bulk_file(
+        map_store,
+        args.file,
+        args.update_existing,
+        code_column=args.code_column,
+        commissioner_column=args.commissioner_column,
+        status_column=args.status_column,
+        active_only=args.active_only,
+    )
+    logger.info(
+        f"Read {counts['read']} practices: {counts['added']} added, "
+        f"{counts['updated']} updated, {counts['unchanged']} unchanged."
+    )
+    if counts["kept"]:
+        logger.info(f"Kept {counts['kept']} existing mappings that differ from the extract "
+                    f"(use --update-existing to overwrite them).")
+
+    if map_store.is_csv_out_of_date():
+        logger.info(f"Updating {args.map_file}...")
+        map_store.export_csv(args.map_file)
+    logger.info(f"Map store has {map_store.count()} mappings.")
+    map_store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Load Test for the GP Supplier Lookup Server
+
+Starts `gp_lookup.py --serve` on a local port, then for each concurrency
+level opens that many keep-alive connections at once and has every client
+send a series of /ods/<code> lookups for random practices. Reports the
+client-side p50/p99 latency and throughput per level, followed by the
+server's own /metrics counters.
+
+The clients share one asyncio event loop in this process, so at the highest
+levels the figures include client-side scheduling delay as well as server
+time. File descriptor limits are raised to the hard limit automatically;
+if connections still fail, raise `ulimit -n` and the kernel's
+net.core.somaxconn.
+
+Usage:
+    python execution/load_test_lookup_server.py
+    python execution/load_test_lookup_server.py --clients 1000 5000 10000 --requests 20
+    python execution/load_test_lookup_server.py --month 2025-01 --port 8799
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+# Add execution directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gp_lookup import GPSupplierLookup, get_data_file
+from gp_lookup_server import SERVER_HOST, get_percentile
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+# Seconds to wait for the server to start accepting connections
+SERVER_START_TIMEOUT = 60
+
+# Seconds a client waits for a connection or response before counting it as failed
+CLIENT_TIMEOUT = 60
+
+
+def raise_open_file_limit():
+    """Raise the soft open file limit to the hard limit, so thousands of sockets can be opened"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def wait_for_server(port: int):
+    """
+    Wait until the server accepts connections
+
+    Args:
+        port: The server's port
+    """
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(SERVER_HOST, port)
+            writer.close()
+            await writer.wait_closed()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise Exception(f"Server did not start listening on port {port}")
+            await asyncio.sleep(0.2)
+
+
+async def send_request(reader, writer, path: str):
+    """
+    Send a GET request on a keep-alive connection and read the response
+
+    Args:
+        reader: The connection's StreamReader
+        writer: The connection's StreamWriter
+        path: The request path (e.g. "/ods/A81001")
+
+    Returns:
+        Tuple of (HTTP status code, response body bytes)
+    """
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {SERVER_HOST}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    status = int(head.split(" ", 2)[1])
+    content_length = 0
+    for line in head.split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            content_length = int(value)
+    body = await reader.readexactly(content_length)
+    return status, body
+
+
+async def run_client(port: int, paths: list[str], requests: int, start: asyncio.Event, results: dict):
+    """
+    Open one connection, wait for the start signal, then send requests on it
+
+    Args:
+        port: The server's port
+        paths: Paths to pick requests from at random
+        requests: Number of requests to send
+        start: Event set once every client has connected
+        results: Shared dict of latencies and failure counts to add to
+    """
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(SERVER_HOST, port), CLIENT_TIMEOUT
+        )
+    except (OSError, asyncio.TimeoutError):
+        results["connect_failures"] += 1
+        return
+
+    results["connected"] += 1
+    await start.wait()
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            status, _ = await asyncio.wait_for(
+                send_request(reader, writer, random.choice(paths)), CLIENT_TIMEOUT
+            )
+            results["latencies"].append(time.perf_counter() - started)
+            if status != 200:
+                results["error_responses"] += 1
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        results["request_failures"] += 1
+    finally:
+        writer.close()
+
+
+async def run_level(port: int, paths: list[str], clients: int, requests: int):
+    """
+    Run one concurrency level and print its results
+
+    Args:
+        port: The server's port
+        paths: Paths to pick requests from at random
+        clients: Number of concurrent keep-alive connections
+        requests: Number of requests per connection
+    """
+    results = {
+        "connected": 0,
+        "connect_failures": 0,
+        "request_failures": 0,
+        "error_responses": 0,
+        "latencies": [],
+    }
+    start = asyncio.Event()
+    tasks = [
+        asyncio.create_task(run_client(port, paths, requests, start, results))
+        for _ in range(clients)
+    ]
+
+    # Let every client connect before any of them send a request
+    while results["connected"] + results["connect_failures"] < clients:
+        await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(results["latencies"])
+    p50 = get_percentile(latencies, 50)
+    p99 = get_percentile(latencies, 99)
+    print(
+        f"{clients:>6} clients: {len(latencies):>8} requests in {elapsed:6.2f}s "
+        f"({len(latencies) / elapsed:8.0f} req/s)  "
+        f"p50 {p50 * 1000 if p50 is not None else 0:7.2f}ms  "
+        f"p99 {p99 * 1000 if p99 is not None else 0:7.2f}ms  "
+        f"connect failures {results['connect_failures']}  "
+        f"request failures {results['request_failures']}  "
+        f"non-200 {results['error_responses']}"
+    )
+
+
+async def run_load_test(port: int, paths: list[str], levels: list[int], requests: int):
+    """
+    Run every concurrency level against the server and print its metrics
+
+    Args:
+        port: The server's port
+        paths: Paths to pick requests from at random
+        levels: Numbers of concurrent clients to test
+        requests: Number of requests per client
+    """
+    await wait_for_server(port)
+
+    for clients in levels:
+        await run_level(port, paths, clients, requests)
+
+    reader, writer = await asyncio.open_connection(SERVER_HOST, port)
+    _, body = await send_request(reader, writer, "/metrics")
+    writer.close()
+    print("\nServer metrics:")
+    print(json.dumps(json.loads(body), indent=2))
+
+
+def main():
+    """Main CLI interface"""
+    parser = argparse.ArgumentParser(
+        description="Load test the GP supplier lookup server"
+    )
+
+    parser.add_argument(
+        "--clients",
+        type=int,
+        nargs="+",
+        default=[1000, 5000, 10000],
+        help="Concurrent client counts to test (default: 1000 5000 10000)"
+    )
+
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=10,
+        help="Requests sent by each client (default: 10)"
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8799,
+        help="Port to run the server on (default: 8799)"
+    )
+
+    parser.add_argument(
+        "--month",
+        type=str,
+        help="The month of the data to serve (e.g. 2025-01). Defaults to latest."
+    )
+
+    args = parser.parse_args()
+
+    data_file = get_data_file(args.month)
+    if data_file is None:
+        print("Error: No GP supplier data files found", file=sys.stderr)
+        sys.exit(1)
+
+    lookup = GPSupplierLookup(data_file=data_file)
+    paths = [f"/ods/{row['GP_ODS_CODE']}" for row in lookup.data]
+
+    raise_open_file_limit()
+
+    command = [
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "gp_lookup.py"),
+        "--serve",
+        "--port",
+        str(args.port),
+    ]
+    if args.month:
+        command += ["--month", args.month]
+    server = subprocess.Popen(command, preexec_fn=raise_open_file_limit if resource else None)
+
+    try:
+        asyncio.run(run_load_test(args.port, paths, args.clients, args.requests))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
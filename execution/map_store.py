@@ -0,0 +1,420 @@
+"""
+GP to ICB Sub location map store
+
+Keeps the ODS code -> ICB Sub location map in an indexed SQLite database,
+so enrichment can look codes up without re-parsing the whole map CSV and
+can save newly resolved codes in batched transactions instead of
+reopening the CSV for every row.
+
+The CSV remains the published copy of the map: changes to it are applied
+to the store when they are detected (including rows deleted by hand), and
+the store writes it back out (de-duplicated, in the original row order with
+new codes at the end) after codes are added.
+
+The store also remembers codes that couldn't be resolved, with the reason
+and when they were last checked, so later runs can skip them until that
+result is older than their negative cache TTL.
+
+Enrichment runs checkpoint the codes they have looked up in the same
+transaction as the results, so a run that is interrupted can be resumed
+without repeating any lookup.
+"""
+
+import csv
+import os
+from pathlib import Path
+import sqlite3
+import time
+
+
+MAP_DB_FILE = "execution/data/GP to ICB Sub location - Map.db"
+
+# Maximum codes per SELECT ... IN (...) query, below SQLite's variable limit
+LOOKUP_BATCH_SIZE = 500
+
+
+class CommissionerMapStore:
+    """SQLite-backed ODS code -> ICB Sub location map"""
+
+    def __init__(self, db_file: str = MAP_DB_FILE, read_only: bool = False):
+        """
+        Open (or create) the store
+
+        Args:
+            db_file: Path to the SQLite database file
+            read_only: Work on an in-memory copy of the database (empty if it doesn't
+                exist), so changes such as a CSV sync are never written to db_file
+        """
+        self.db_file = db_file
+        if read_only:
+            self.connection = sqlite3.connect(":memory:")
+            if os.path.exists(db_file):
+                source = sqlite3.connect(f"{Path(os.path.abspath(db_file)).as_uri()}?mode=ro", uri=True)
+                try:
+                    source.backup(self.connection)
+                finally:
+                    source.close()
+        else:
+            db_dir = os.path.dirname(db_file)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self.connection = sqlite3.connect(db_file)
+        with self.connection:
+            # in_csv marks codes that were in the map CSV when it was last synced or
+            # exported, so codes missing from a changed CSV were deleted by hand,
+            # while codes added since the last export are kept
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS commissioner_map ("
+                " ods_code TEXT NOT NULL UNIQUE,"
+                " icb_code TEXT NOT NULL,"
+                " in_csv INTEGER NOT NULL DEFAULT 0)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS failed_lookups ("
+                " ods_code TEXT PRIMARY KEY,"
+                " reason TEXT NOT NULL,"
+                " checked_at REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS run_checkpoints ("
+                " run_key TEXT NOT NULL,"
+                " ods_code TEXT NOT NULL,"
+                " PRIMARY KEY (run_key, ods_code))"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS store_metadata ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT)"
+            )
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(commissioner_map)")]
+            if "in_csv" not in columns:
+                # A store from before deletions were tracked: unless it has unexported
+                # codes, everything in it was in the CSV
+                self.connection.execute(
+                    "ALTER TABLE commissioner_map ADD COLUMN in_csv INTEGER NOT NULL DEFAULT 0"
+                )
+                if not self.is_csv_out_of_date():
+                    self.connection.execute("UPDATE commissioner_map SET in_csv = 1")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the database connection"""
+        self.connection.close()
+
+    def count(self):
+        """Get the number of mapped ODS codes"""
+        return self.connection.execute("SELECT COUNT(*) FROM commissioner_map").fetchone()[0]
+
+    def get(self, ods_code: str):
+        """
+        Look up the ICB Sub location for an ODS code
+
+        Args:
+            ods_code: GP ODS code (e.g. "A81001")
+
+        Returns:
+            The ICB Sub location code, or None if the code isn't mapped
+        """
+        row = self.connection.execute(
+            "SELECT icb_code FROM commissioner_map WHERE ods_code = ?", (ods_code,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, ods_codes):
+        """
+        Look up the ICB Sub locations for many ODS codes
+
+        Args:
+            ods_codes: Iterable of GP ODS codes
+
+        Returns:
+            Dict of ODS code to ICB Sub location code, for the codes that are mapped
+        """
+        return self.select_by_codes(
+            "SELECT ods_code, icb_code FROM commissioner_map WHERE ods_code IN ({placeholders})",
+            ods_codes,
+        )
+
+    def select_by_codes(self, query: str, ods_codes, parameters=()):
+        """
+        Run a two-column query over many ODS codes, in batches
+
+        Args:
+            query: SQL with an `IN ({placeholders})` clause for the codes
+            ods_codes: Iterable of GP ODS codes
+            parameters: Extra query parameters, bound after the codes
+
+        Returns:
+            Dict built from the (key, value) rows of every batch
+        """
+        ods_codes = list(dict.fromkeys(ods_codes))
+        results = {}
+        for start in range(0, len(ods_codes), LOOKUP_BATCH_SIZE):
+            batch = ods_codes[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            results.update(
+                self.connection.execute(query.format(placeholders=placeholders), [*batch, *parameters])
+            )
+        return results
+
+    def get_all(self):
+        """
+        Get the whole map
+
+        Returns:
+            Dict of ODS code to ICB Sub location code, in store order
+        """
+        return dict(self.connection.execute(
+            "SELECT ods_code, icb_code FROM commissioner_map ORDER BY rowid"
+        ))
+
+    def upsert_many(self, mappings):
+        """
+        Add or update many mappings in a single transaction
+
+        Existing codes keep their position in the exported CSV, and any
+        failed lookups recorded for the codes are forgotten.
+
+        Args:
+            mappings: Iterable of (ODS code, ICB Sub location code) pairs
+
+        Returns:
+            The number of mappings written
+        """
+        mappings = list(mappings)
+        if not mappings:
+            return 0
+        with self.connection:
+            self.write_mappings(mappings)
+            self.write_metadata("csv_out_of_date", "1")
+        return len(mappings)
+
+    def write_mappings(self, mappings):
+        """Add or update mappings, without committing"""
+        self.connection.executemany(
+            "INSERT INTO commissioner_map (ods_code, icb_code) VALUES (?, ?)"
+            " ON CONFLICT (ods_code) DO UPDATE SET icb_code = excluded.icb_code",
+            mappings,
+        )
+        self.connection.executemany(
+            "DELETE FROM failed_lookups WHERE ods_code = ?",
+            ((ods_code,) for ods_code, _ in mappings),
+        )
+
+    def get_failures(self, ods_codes, max_age: float):
+        """
+        Look up recent failed lookups for many ODS codes
+
+        Args:
+            ods_codes: Iterable of GP ODS codes
+            max_age: Seconds a failure is remembered for (0 or less ignores every failure)
+
+        Returns:
+            Dict of ODS code to failure reason, for codes that failed within max_age
+        """
+        if max_age <= 0:
+            return {}
+        return self.select_by_codes(
+            "SELECT ods_code, reason FROM failed_lookups"
+            " WHERE ods_code IN ({placeholders}) AND checked_at >= ?",
+            ods_codes,
+            (time.time() - max_age,),
+        )
+
+    def record_failures(self, failures):
+        """
+        Remember many failed lookups in a single transaction
+
+        Args:
+            failures: Iterable of (ODS code, failure reason) pairs, checked now
+
+        Returns:
+            The number of failures written
+        """
+        failures = list(failures)
+        if not failures:
+            return 0
+        with self.connection:
+            self.write_failures(failures)
+        return len(failures)
+
+    def write_failures(self, failures):
+        """Remember failed lookups as checked now, without committing"""
+        checked_at = time.time()
+        self.connection.executemany(
+            "INSERT INTO failed_lookups (ods_code, reason, checked_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (ods_code) DO UPDATE"
+            " SET reason = excluded.reason, checked_at = excluded.checked_at",
+            ((ods_code, reason, checked_at) for ods_code, reason in failures),
+        )
+
+    def purge_failures(self, max_age: float):
+        """
+        Forget failed lookups older than max_age seconds
+
+        Returns:
+            The number of failures removed
+        """
+        with self.connection:
+            return self.connection.execute(
+                "DELETE FROM failed_lookups WHERE checked_at < ?", (time.time() - max_age,)
+            ).rowcount
+
+    def get_checkpoint(self, run_key: str):
+        """
+        Get the codes a run has already looked up
+
+        Args:
+            run_key: Identifies the run (e.g. "enrich:2025-01")
+
+        Returns:
+            Set of ODS codes checkpointed for the run (empty if it has no checkpoint)
+        """
+        return {
+            row[0] for row in self.connection.execute(
+                "SELECT ods_code FROM run_checkpoints WHERE run_key = ?", (run_key,)
+            )
+        }
+
+    def save_checkpoint(self, run_key: str, completed_codes, mappings=(), failures=()):
+        """
+        Save lookup results and mark their codes as done, in a single transaction
+
+        Args:
+            run_key: Identifies the run
+            completed_codes: Iterable of every ODS code looked up since the last checkpoint,
+                including lookups that failed without a result worth keeping
+            mappings: Iterable of (ODS code, ICB Sub location code) pairs found
+            failures: Iterable of (ODS code, failure reason) pairs to remember
+
+        Returns:
+            The number of codes checkpointed
+        """
+        completed_codes = list(completed_codes)
+        mappings = list(mappings)
+        with self.connection:
+            if mappings:
+                self.write_mappings(mappings)
+                self.write_metadata("csv_out_of_date", "1")
+            self.write_failures(failures)
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO run_checkpoints (run_key, ods_code) VALUES (?, ?)",
+                ((run_key, ods_code) for ods_code in completed_codes),
+            )
+        return len(completed_codes)
+
+    def clear_checkpoint(self, run_key: str):
+        """Forget a run's checkpoint, once it has finished or is being restarted"""
+        with self.connection:
+            self.connection.execute("DELETE FROM run_checkpoints WHERE run_key = ?", (run_key,))
+
+    def get_metadata(self, key: str):
+        """Get a stored metadata value, or None if it isn't set"""
+        row = self.connection.execute(
+            "SELECT value FROM store_metadata WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_metadata(self, key: str, value: str):
+        """Set a stored metadata value"""
+        with self.connection:
+            self.write_metadata(key, value)
+
+    def write_metadata(self, key: str, value: str):
+        """Set a stored metadata value, without committing"""
+        self.connection.execute(
+            "INSERT INTO store_metadata (key, value) VALUES (?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def is_csv_out_of_date(self):
+        """Check whether mappings have been added since the map CSV was last exported"""
+        return self.get_metadata("csv_out_of_date") == "1"
+
+    def get_csv_signature(self, map_file: str):
+        """Get a string identifying the current version of the map CSV"""
+        stat = os.stat(map_file)
+        return f"{os.path.abspath(map_file)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def sync_from_csv(self, map_file: str):
+        """
+        Apply the map CSV to the store if it has changed since the last sync
+
+        Rows in the CSV are added or updated, and codes that were in the CSV
+        at the last sync or export but have since been removed from it are
+        deleted. Codes resolved since the last export are kept.
+
+        Args:
+            map_file: Path to the GP to ICB Sub location map CSV
+
+        Returns:
+            The number of mappings imported (0 if the CSV is missing or unchanged)
+        """
+        if not os.path.exists(map_file):
+            return 0
+
+        signature = self.get_csv_signature(map_file)
+        if self.get_metadata("csv_signature") == signature:
+            return 0
+
+        mappings = []
+        with open(map_file, "r", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                if row.get("GP_ODS_CODE") and row.get("ICB Sub location"):
+                    mappings.append((row["GP_ODS_CODE"], row["ICB Sub location"]))
+
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS csv_codes (ods_code TEXT PRIMARY KEY)")
+            self.connection.execute("DELETE FROM csv_codes")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO csv_codes (ods_code) VALUES (?)",
+                ((ods_code,) for ods_code, _ in mappings),
+            )
+            self.connection.execute(
+                "DELETE FROM commissioner_map"
+                " WHERE in_csv = 1 AND ods_code NOT IN (SELECT ods_code FROM csv_codes)"
+            )
+            self.write_mappings(mappings)
+            self.connection.execute(
+                "UPDATE commissioner_map SET in_csv = 1"
+                " WHERE ods_code IN (SELECT ods_code FROM csv_codes)"
+            )
+            self.connection.execute("DELETE FROM csv_codes")
+            self.write_metadata("csv_signature", signature)
+        return len(mappings)
+
+    def export_csv(self, map_file: str):
+        """
+        Write the store back out as the map CSV
+
+        The file is replaced atomically, and recorded as in sync with the store.
+
+        Args:
+            map_file: Path to the GP to ICB Sub location map CSV
+
+        Returns:
+            The number of mappings written
+        """
+        tmp_file = f"{map_file}.tmp"
+        count = 0
+        with open(tmp_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(["ICB Sub location", "GP_ODS_CODE"])
+            for ods_code, icb_code in self.connection.execute(
+                "SELECT ods_code, icb_code FROM commissioner_map ORDER BY rowid"
+            ):
+                writer.writerow([icb_code, ods_code])
+                count += 1
+        os.replace(tmp_file, map_file)
+
+        with self.connection:
+            self.connection.execute("UPDATE commissioner_map SET in_csv = 1")
+            self.write_metadata("csv_signature", self.get_csv_signature(map_file))
+            self.write_metadata("csv_out_of_date", "0")
+        return count
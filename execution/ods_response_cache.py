@@ -0,0 +1,227 @@
+"""
+On-disk cache of raw NHS ODS API responses
+
+Keeps the full organisation JSON from every successful ODS API lookup, so
+fields other than the commissioner (PCN membership, address, open/close
+dates, other relationship types) can be derived later without refetching.
+
+Response bodies are stored content-addressed, once per distinct SHA-256,
+under <cache dir>/objects/<first 2 hex digits>/<hash>.json, so refetching
+an organisation that hasn't changed costs no extra space. A SQLite index in
+the same directory records every fetch (ODS code, fetch time, hash) and
+when each body was last used. When the bodies outgrow the size limit, the
+least recently used are evicted along with the fetches that point at them.
+
+The cache is safe to share between the threads of one process.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+RESPONSE_CACHE_DIR = "execution/data/ods_response_cache"
+
+# Default limit on the total size of cached response bodies
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+
+# Bodies are evicted until the cache is this fraction of its limit, so a
+# full cache doesn't evict on every new response
+EVICTION_TARGET = 0.9
+
+
+class ODSResponseCache:
+    """Content-addressed store of ODS organisation JSON with LRU eviction"""
+
+    def __init__(self, cache_dir: str = RESPONSE_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Open (or create) the cache
+
+        Args:
+            cache_dir: Directory holding the index and response bodies
+            max_bytes: Limit on the total size of the response bodies
+        """
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(cache_dir, "index.db"), check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS bodies ("
+                " sha256 TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS fetches ("
+                " ods_code TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " sha256 TEXT NOT NULL,"
+                " PRIMARY KEY (ods_code, fetched_at))"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS fetches_sha256 ON fetches (sha256)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS bodies_last_used ON bodies (last_used)")
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the index database"""
+        with self.lock:
+            self.connection.close()
+
+    def get_body_path(self, sha256: str):
+        """Get the path a response body is stored at"""
+        return os.path.join(self.cache_dir, "objects", sha256[:2], f"{sha256}.json")
+
+    def put(self, ods_code: str, content: bytes, fetched_at: float = None):
+        """
+        Record a fetched organisation response
+
+        Args:
+            ods_code: The organisation's ODS code
+            content: The raw response body
+            fetched_at: When it was fetched, as a Unix timestamp (default: now)
+
+        Returns:
+            The SHA-256 hex digest the body is stored under
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        body_path = self.get_body_path(sha256)
+
+        with self.lock:
+            known = self.connection.execute(
+                "SELECT 1 FROM bodies WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            if not known or not os.path.exists(body_path):
+                os.makedirs(os.path.dirname(body_path), exist_ok=True)
+                tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, body_path)
+
+            with self.connection:
+                if not known:
+                    self.total_bytes += len(content)
+                self.connection.execute(
+                    "INSERT INTO bodies (sha256, size, last_used) VALUES (?, ?, ?)"
+                    " ON CONFLICT (sha256) DO UPDATE SET last_used = excluded.last_used",
+                    (sha256, len(content), fetched_at),
+                )
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO fetches (ods_code, fetched_at, sha256) VALUES (?, ?, ?)",
+                    (ods_code.upper(), fetched_at, sha256),
+                )
+
+            if self.total_bytes > self.max_bytes:
+                self.evict(int(self.max_bytes * EVICTION_TARGET))
+        return sha256
+
+    def get(self, ods_code: str, fetched_before: float = None):
+        """
+        Get the most recent cached response for an organisation
+
+        Args:
+            ods_code: The organisation's ODS code
+            fetched_before: Only consider fetches at or before this Unix timestamp
+
+        Returns:
+            (fetched_at, raw response body) for the latest fetch, or None if none is cached
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT fetched_at, sha256 FROM fetches WHERE ods_code = ? AND fetched_at <= ?"
+                " ORDER BY fetched_at DESC LIMIT 1",
+                (ods_code.upper(), float("inf") if fetched_before is None else fetched_before),
+            ).fetchone()
+            if not row:
+                return None
+            fetched_at, sha256 = row
+            try:
+                with open(self.get_body_path(sha256), "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                # The body was deleted from disk; forget it
+                self.remove_bodies([sha256])
+                return None
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE bodies SET last_used = ? WHERE sha256 = ?", (time.time(), sha256)
+                )
+        return fetched_at, content
+
+    def get_json(self, ods_code: str, fetched_before: float = None):
+        """
+        Get the most recent cached organisation JSON
+
+        Args:
+            ods_code: The organisation's ODS code
+            fetched_before: Only consider fetches at or before this Unix timestamp
+
+        Returns:
+            The decoded response (e.g. {"Organisation": {...}}), or None if none is cached
+        """
+        cached = self.get(ods_code, fetched_before)
+        return json.loads(cached[1]) if cached else None
+
+    def get_fetches(self, ods_code: str):
+        """
+        List every cached fetch of an organisation
+
+        Returns:
+            List of (fetched_at, SHA-256) tuples, oldest first
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT fetched_at, sha256 FROM fetches WHERE ods_code = ? ORDER BY fetched_at",
+                (ods_code.upper(),),
+            ).fetchall()
+
+    def evict(self, target_bytes: int):
+        """
+        Remove least recently used bodies until the cache fits target_bytes (call with the lock held)
+
+        Returns:
+            The number of bodies removed
+        """
+        evicted = []
+        remaining = self.total_bytes
+        for sha256, size in self.connection.execute(
+            "SELECT sha256, size FROM bodies ORDER BY last_used"
+        ).fetchall():
+            if remaining <= target_bytes:
+                break
+            evicted.append(sha256)
+            remaining -= size
+        self.remove_bodies(evicted)
+        return len(evicted)
+
+    def remove_bodies(self, sha256s):
+        """Delete bodies and the fetches that point at them (call with the lock held)"""
+        sha256s = list(sha256s)
+        if not sha256s:
+            return
+        with self.connection:
+            for sha256 in sha256s:
+                row = self.connection.execute(
+                    "SELECT size FROM bodies WHERE sha256 = ?", (sha256,)
+                ).fetchone()
+                if row:
+                    self.total_bytes -= row[0]
+                self.connection.execute("DELETE FROM bodies WHERE sha256 = ?", (sha256,))
+                self.connection.execute("DELETE FROM fetches WHERE sha256 = ?", (sha256,))
+        for sha256 in sha256s:
+            try:
+                os.remove(self.get_body_path(sha256))
+            except FileNotFoundError:
+                pass
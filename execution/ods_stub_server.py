@@ -0,0 +1,232 @@
+"""
+Local Stand-in for the NHS ODS API
+
+Serves `GET .../organisations/<ODS code>` with the same JSON shape as the
+NHS ODS ORD API (an Organisation with an active RE4 'Commissioned By'
+relationship), so enrichment throughput can be measured offline without
+touching the real API or its rate limit.
+
+ICB codes come from the GP to ICB Sub location map where the code is known,
+and are otherwise derived from the ODS code. A configurable fraction of
+codes answer 404, and every response is delayed to simulate network latency.
+An optional request rate limit answers excess requests with 429 and a
+Retry-After header, like the real API's throttling.
+
+Usage:
+    python execution/ods_stub_server.py --port 8798 --latency 0.3
+    python execution/enrich_gp_data.py --month 2025-01 \\
+        --ods-api-url http://127.0.0.1:8798/ORD/2-0-0/organisations --map-file .tmp/map.csv --map-db .tmp/map.db
+"""
+
+import argparse
+import csv
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import sys
+import threading
+import time
+
+
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8798
+STUB_API_PATH = "/ORD/2-0-0/organisations"
+MAP_FILE = "execution/data/GP to ICB Sub location - Map.csv"
+
+
+def load_icb_codes(map_file: str):
+    """
+    Load known ODS code -> ICB code pairs to answer with
+
+    Args:
+        map_file: Path to the GP to ICB Sub location map CSV
+
+    Returns:
+        Dict of ODS code to ICB code (empty if the file doesn't exist)
+    """
+    if not map_file or not os.path.exists(map_file):
+        return {}
+    with open(map_file, "r", encoding="utf-8-sig") as f:
+        return {row["GP_ODS_CODE"]: row["ICB Sub location"] for row in csv.DictReader(f)}
+
+
+def get_code_hash(ods_code: str):
+    """Get a stable number in [0, 1) for an ODS code"""
+    digest = hashlib.sha256(ods_code.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def build_organisation(ods_code: str, icb_code: str):
+    """
+    Build an ODS API organisation response
+
+    Args:
+        ods_code: The practice's ODS code
+        icb_code: The commissioner code to return in the RE4 relationship
+
+    Returns:
+        Dict in the ODS ORD API response shape
+    """
+    return {
+        "Organisation": {
+            "Name": f"STAND-IN PRACTICE {ods_code}",
+            "OrgId": {"extension": ods_code},
+            "Status": "Active",
+            "Rels": {
+                "Rel": [
+                    {
+                        "id": "RE4",
+                        "Status": "Active",
+                        "Date": [{"Type": "Operational", "Start": "2020-04-01"}],
+                        "Target": {
+                            "OrgId": {"extension": icb_code},
+                            "PrimaryRoleId": {"id": "RO98"},
+                        },
+                    }
+                ]
+            },
+        }
+    }
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """Answers organisation requests like the ODS API"""
+
+    # Allow keep-alive connections, as the real API does
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body are separate writes; don't let Nagle hold the body back
+    # waiting for a delayed ACK on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        stub = self.server
+        stub.count_request()
+        time.sleep(stub.latency)
+
+        if not stub.allow_request():
+            self.send_json(429, {"errorCode": 429, "errorText": "Too many requests"},
+                           {"Retry-After": str(stub.retry_after)})
+            return
+
+        path = self.path.split("?", 1)[0].rstrip("/")
+        prefix, _, ods_code = path.rpartition("/")
+        ods_code = ods_code.upper()
+
+        if not prefix.endswith("/organisations") or not ods_code:
+            self.send_json(404, {"errorCode": 404, "errorText": "Not found"})
+        elif get_code_hash(ods_code) < stub.not_found_rate:
+            self.send_json(404, {"errorCode": 404, "errorText": "Not found"})
+        else:
+            icb_code = stub.icb_codes.get(ods_code) or f"{int(get_code_hash(ods_code) * 100):02d}X"
+            self.send_json(200, build_organisation(ods_code, icb_code))
+
+    def send_json(self, status: int, body: dict, headers: dict = None):
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the stand-in API's settings and counters"""
+
+    daemon_threads = True
+
+    def __init__(self, port=STUB_PORT, latency=0.0, not_found_rate=0.0, map_file=MAP_FILE,
+                 rate_limit=0.0, retry_after=1, verbose=False):
+        super().__init__((STUB_HOST, port), StubRequestHandler)
+        self.latency = latency
+        self.not_found_rate = not_found_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.allowance = rate_limit
+        self.allowance_updated = time.monotonic()
+        self.throttled_count = 0
+        self.icb_codes = load_icb_codes(map_file)
+        self.verbose = verbose
+        self.request_count = 0
+        self.connection_count = 0
+        self.counter_lock = threading.Lock()
+
+    def count_request(self):
+        with self.counter_lock:
+            self.request_count += 1
+
+    def allow_request(self):
+        """Check a request against the rate limit (a token bucket holding one second of requests)"""
+        if self.rate_limit <= 0:
+            return True
+        with self.counter_lock:
+            now = time.monotonic()
+            self.allowance = min(
+                self.rate_limit, self.allowance + (now - self.allowance_updated) * self.rate_limit
+            )
+            self.allowance_updated = now
+            if self.allowance >= 1:
+                self.allowance -= 1
+                return True
+            self.throttled_count += 1
+            return False
+
+    def process_request(self, request, client_address):
+        with self.counter_lock:
+            self.connection_count += 1
+        super().process_request(request, client_address)
+
+    @property
+    def api_url(self):
+        """The base URL to pass as the ODS API URL"""
+        return f"http://{STUB_HOST}:{self.server_address[1]}{STUB_API_PATH}"
+
+
+def start_stub_server(**kwargs):
+    """
+    Start a stand-in ODS API server on a background thread
+
+    Args:
+        **kwargs: StubServer settings (port=0 picks a free port)
+
+    Returns:
+        The running StubServer; call shutdown() and server_close() when done
+    """
+    server = StubServer(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in for the NHS ODS API"
+    )
+
+    parser.add_argument("--port", type=int, default=STUB_PORT, help=f"Port to listen on (default: {STUB_PORT})")
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds to delay each response (default: 0.3)")
+    parser.add_argument("--not-found-rate", type=float, default=0.01, help="Fraction of codes that return 404 (default: 0.01)")
+    parser.add_argument("--map-file", type=str, default=MAP_FILE, help="Map CSV to take known ICB codes from")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Requests/second before answering 429; 0 for none (default: 0)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s (default: 1)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+
+    args = parser.parse_args()
+
+    server = StubServer(
+        args.port, args.latency, args.not_found_rate, args.map_file,
+        args.rate_limit, args.retry_after, args.verbose,
+    )
+    print(f"Stand-in ODS API at {server.api_url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,128 @@
+"""
+Rate control for NHS API clients
+
+Provides a thread-safe token bucket whose rate adapts to server feedback
+(additive increase, multiplicative decrease): every accepted request nudges
+the rate up towards a ceiling, and every HTTP 429 cuts it and pauses all
+callers for the server's Retry-After period. Callers only wait when they
+are about to make a real request, never after a response.
+"""
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import threading
+import time
+
+
+# Seconds to pause after a 429 that has no usable Retry-After header
+DEFAULT_RETRY_AFTER = 5.0
+
+# Factor the rate is multiplied by on a 429
+DECREASE_FACTOR = 0.5
+
+# Requests/second added to the rate for each second of accepted requests
+ADDITIVE_INCREASE = 0.5
+
+# Minimum seconds between rate decreases, so a burst of 429s from requests
+# that were already in flight only counts as one congestion signal
+DECREASE_COOLDOWN = 1.0
+
+
+def parse_retry_after(value):
+    """
+    Parse an HTTP Retry-After header
+
+    Args:
+        value: The header value, in seconds (e.g. "5") or as an HTTP date, or None
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucketRateLimiter:
+    """Thread-safe token bucket with an AIMD rate driven by 429 responses"""
+
+    def __init__(self, rate: float, max_rate: float = None, min_rate: float = 0.2, burst: float = 1.0):
+        """
+        Initialize the limiter
+
+        Args:
+            rate: Starting requests/second; 0 or less for no limit
+            max_rate: Ceiling the rate may grow back to (default: the starting rate)
+            min_rate: Floor the rate may be cut to
+            burst: Maximum requests that may start back to back after an idle period
+        """
+        self.rate = rate
+        self.max_rate = max(max_rate or rate, rate)
+        self.min_rate = min(min_rate, rate) if rate > 0 else min_rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = float("-inf")
+        self.throttled_count = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller may start a request"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self.refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def refill(self, now: float):
+        """Add the tokens earned since the last update (call with the lock held)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def on_success(self):
+        """Record a request the server accepted, raising the rate towards max_rate"""
+        if self.rate <= 0:
+            return
+        with self.lock:
+            self.refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE / self.rate)
+
+    def on_throttle(self, retry_after: float = None):
+        """
+        Record a 429 response: cut the rate and pause every caller
+
+        Args:
+            retry_after: Seconds the server asked clients to wait, if given
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.throttled_count += 1
+            self.paused_until = max(
+                self.paused_until,
+                now + (retry_after if retry_after is not None else DEFAULT_RETRY_AFTER),
+            )
+            self.tokens = 0
+            self.updated = now
+            if self.rate > 0 and now - self.last_decrease >= DECREASE_COOLDOWN:
+                self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+                self.last_decrease = now